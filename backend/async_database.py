@@ -0,0 +1,90 @@
+# Async data-access layer for the hot read routes.
+# A psycopg 3 AsyncConnectionPool lets one worker keep many queries in flight
+# instead of parking each request on a threadpool thread. Write paths use the
+# sync managed pool from db_pool.py (main.py points get_db at it).
+import os
+import time
+from dotenv import load_dotenv
+import psycopg
+from psycopg import AsyncCursor
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from fastapi import HTTPException
+from sql_trace import observe, log_plan, explain_prefix
+
+load_dotenv()
+
+ASYNC_DB_POOL_MIN = int(os.getenv("ASYNC_DB_POOL_MIN", "2"))
+ASYNC_DB_POOL_MAX = int(os.getenv("ASYNC_DB_POOL_MAX", "20"))
+ASYNC_DB_POOL_TIMEOUT = float(os.getenv("ASYNC_DB_POOL_TIMEOUT", os.getenv("DB_POOL_TIMEOUT", "5")))
+
+
+def _conninfo():
+    if os.getenv("DATABASE_URL"):
+        return os.getenv("DATABASE_URL")
+    params = {
+        "host": os.getenv("DB_HOST"), "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"), "password": os.getenv("DB_PASSWORD"), "port": os.getenv("DB_PORT"),
+    }
+    return make_conninfo(**{k: v for k, v in params.items() if v})
+
+
+class TimedAsyncCursor(AsyncCursor):
+    """Reports every statement to sql_trace/metrics, like db_pool's sync cursors."""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            if observe(query, params, time.perf_counter() - started):
+                await self._explain(query, params)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            observe(query, None, time.perf_counter() - started)
+
+    async def _explain(self, query, params):
+        try:
+            async with AsyncCursor(self.connection, row_factory=tuple_row) as cur:
+                await cur.execute(explain_prefix(query) + query, params)
+                log_plan(await cur.fetchall())
+        except psycopg.Error as e:
+            print(f"  EXPLAIN failed: {e}")
+
+
+# Read routes run in autocommit: no BEGIN/COMMIT round trips, rows come back as dicts
+async_pool = AsyncConnectionPool(
+    _conninfo(),
+    min_size=ASYNC_DB_POOL_MIN,
+    max_size=ASYNC_DB_POOL_MAX,
+    timeout=ASYNC_DB_POOL_TIMEOUT,
+    kwargs={"autocommit": True, "row_factory": dict_row, "cursor_factory": TimedAsyncCursor},
+    open=False,
+)
+
+
+async def open_async_pool():
+    await async_pool.open()
+
+
+async def close_async_pool():
+    await async_pool.close()
+
+
+async def get_async_db():
+    """Request-scoped async connection; a 503 when the pool stays exhausted, like db_pool.get_db."""
+    try:
+        conn = await async_pool.getconn(timeout=ASYNC_DB_POOL_TIMEOUT)
+    except PoolTimeout:
+        raise HTTPException(status_code=503, detail=f"No database connection available within {ASYNC_DB_POOL_TIMEOUT}s")
+    except psycopg.OperationalError as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {e}")
+    try:
+        yield conn
+    finally:
+        await async_pool.putconn(conn)
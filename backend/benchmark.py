@@ -0,0 +1,273 @@
+# Load test for the FolkMint API.
+#
+#   python benchmark.py --seed --products 5000      # synthetic catalog via generate_data.py
+#   WEB_CONCURRENCY=4 CACHE_URL=redis://localhost:6379/0 uvicorn main:app
+#                                                     # start the API after seeding; workers come
+#                                                     # from WEB_CONCURRENCY so cache.py sees them
+#   python benchmark.py --vus 50 --duration 60 --save-baseline bench_baseline.json
+#   python benchmark.py --vus 50 --duration 60 --baseline bench_baseline.json
+#
+# Virtual users log in as seeded customers/sellers and loop over weighted
+# scenarios (browse, search, cart, checkout, seller dashboard) against the
+# running app. Throughput and p50/p95/p99 are reported per endpoint and can
+# be compared with a saved baseline. Seeded rows belong to the
+# BENCH_EMAIL_DOMAIN users so --reseed can remove them again.
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import httpx
+from dotenv import load_dotenv
+from generate_data import (
+    BENCH_EMAIL_DOMAIN, BENCH_PASSWORD, BENCH_CATEGORY_PREFIX, ADJECTIVES, MATERIALS, NOUNS,
+    add_size_arguments, connect, load,
+)
+
+load_dotenv('.env')
+
+# scenario -> relative weight, roughly a storefront's traffic mix
+SCENARIO_WEIGHTS = {"browse": 50, "search": 25, "cart": 12, "checkout": 5, "seller": 8}
+
+
+def load_context():
+    """Ids the scenarios pick from, read back from the seeded data."""
+    conn = connect()
+    cur = conn.cursor()
+    like = f"%@{BENCH_EMAIL_DOMAIN}"
+    cur.execute("SELECT email, role::text FROM users WHERE email LIKE %s ORDER BY user_id", (like,))
+    users = cur.fetchall()
+    cur.execute("SELECT category_id FROM category WHERE name LIKE %s", (f"{BENCH_CATEGORY_PREFIX}%",))
+    categories = [r[0] for r in cur.fetchall()]
+    cur.execute("""
+        SELECT pv.variant_id, pv.product_id, pv.price FROM product_variant pv
+        JOIN product p ON p.product_id = pv.product_id
+        JOIN users u ON u.user_id = p.seller_id
+        WHERE u.email LIKE %s AND pv.stock_quantity > 0
+        LIMIT 100000
+    """, (like,))
+    variants = [(vid, pid, float(price)) for vid, pid, price in cur.fetchall()]
+    conn.close()
+    if not users or not variants:
+        sys.exit("No benchmark data found, run with --seed first")
+    return {
+        "customers": [email for email, role in users if role == "customer"],
+        "sellers": [email for email, role in users if role == "seller"],
+        "categories": categories,
+        "variants": variants,
+        "products": sorted({v[1] for v in variants}),
+    }
+
+
+# --- Load generation ---------------------------------------------------------
+
+class Results:
+    def __init__(self):
+        self.recording = False
+        self.samples = {}  # endpoint -> [latency seconds]
+        self.errors = {}
+
+    def add(self, endpoint, elapsed, ok):
+        if not self.recording:
+            return
+        self.samples.setdefault(endpoint, []).append(elapsed)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+async def call(client, results, endpoint, method, url, **kwargs):
+    started = time.perf_counter()
+    ok, body = False, None
+    try:
+        response = await client.request(method, url, **kwargs)
+        body = response.json() if response.headers.get("content-type", "").startswith("application/json") else None
+        ok = response.status_code < 400 and not (isinstance(body, dict) and body.get("success") is False)
+    except httpx.HTTPError:
+        pass
+    results.add(endpoint, time.perf_counter() - started, ok)
+    return body
+
+
+async def browse(vu, ctx, results):
+    rng = vu["rng"]
+    await call(vu["customer"], results, "GET /api/categories", "GET", "/api/categories")
+    page = await call(vu["customer"], results, "GET /api/products?category_id", "GET", "/api/products",
+                      params={"category_id": rng.choice(ctx["categories"]), "limit": 24})
+    if page and page.get("next_cursor"):
+        await call(vu["customer"], results, "GET /api/products?cursor", "GET", "/api/products",
+                   params={"limit": 24, "cursor": page["next_cursor"]})
+    product_id = rng.choice(ctx["products"])
+    await call(vu["customer"], results, "GET /api/products?product_id", "GET", "/api/products", params={"product_id": product_id})
+    await call(vu["customer"], results, "GET /api/products/{id}/reviews", "GET", f"/api/products/{product_id}/reviews")
+    await call(vu["customer"], results, "GET /api/products/top-rated", "GET", "/api/products/top-rated")
+
+
+async def search(vu, ctx, results):
+    rng = vu["rng"]
+    term = rng.choice(MATERIALS + NOUNS)
+    for n in range(2, min(len(term), 5) + 1):
+        await call(vu["customer"], results, "GET /api/products/suggest", "GET", "/api/products/suggest", params={"q": term[:n]})
+    query = f"{rng.choice(ADJECTIVES)} {term}" if rng.random() < 0.5 else term
+    await call(vu["customer"], results, "GET /api/products/search", "GET", "/api/products/search", params={"q": query, "limit": 24})
+
+
+async def cart(vu, ctx, results):
+    rng = vu["rng"]
+    variant_id = rng.choice(ctx["variants"])[0]
+    await call(vu["customer"], results, "POST /api/cart/add", "POST", "/api/cart/add",
+               json={"variant_id": variant_id, "quantity": rng.randint(1, 2)})
+    await call(vu["customer"], results, "GET /api/cart", "GET", "/api/cart")
+
+
+async def checkout(vu, ctx, results):
+    rng = vu["rng"]
+    picked = rng.sample(ctx["variants"], min(len(ctx["variants"]), rng.randint(1, 3)))
+    items = [{"variant_id": vid, "quantity": 1, "price": price} for vid, _, price in picked]
+    for item in items:
+        await call(vu["customer"], results, "POST /api/cart/add", "POST", "/api/cart/add",
+                   json={"variant_id": item["variant_id"], "quantity": item["quantity"]})
+    await call(vu["customer"], results, "POST /api/checkout", "POST", "/api/checkout", json={"items": items})
+
+
+async def seller(vu, ctx, results):
+    await call(vu["seller"], results, "GET /api/seller/products", "GET", "/api/seller/products")
+    await call(vu["seller"], results, "GET /api/seller/orders", "GET", "/api/seller/orders")
+
+
+SCENARIOS = {"browse": browse, "search": search, "cart": cart, "checkout": checkout, "seller": seller}
+
+
+async def login(client, email):
+    response = await client.post("/api/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+    if not response.json().get("success"):
+        raise RuntimeError(f"Login failed for {email}: {response.text}")
+
+
+async def virtual_user(vu, ctx, results, scenarios, deadline):
+    names = list(scenarios)
+    weights = [scenarios[n] for n in names]
+    while time.monotonic() < deadline:
+        await SCENARIOS[vu["rng"].choices(names, weights)[0]](vu, ctx, results)
+        if vu["think_time"]:
+            await asyncio.sleep(vu["rng"].uniform(0, vu["think_time"] * 2))
+
+
+async def run_load(args, ctx):
+    scenarios = {n: w for n, w in SCENARIO_WEIGHTS.items() if n in args.scenarios}
+    results = Results()
+    vus = []
+    for i in range(args.vus):
+        vu = {"rng": random.Random(args.random_seed + i), "think_time": args.think_time}
+        for role, pool in (("customer", ctx["customers"]), ("seller", ctx["sellers"])):
+            vu[role] = httpx.AsyncClient(base_url=args.url, timeout=30)
+            await login(vu[role], pool[i % len(pool)])
+        vus.append(vu)
+
+    try:
+        start = time.monotonic()
+        deadline = start + args.warmup + args.duration
+        tasks = [asyncio.create_task(virtual_user(vu, ctx, results, scenarios, deadline)) for vu in vus]
+        await asyncio.sleep(args.warmup)
+        results.recording = True
+        await asyncio.gather(*tasks)
+    finally:
+        for vu in vus:
+            await vu["customer"].aclose()
+            await vu["seller"].aclose()
+    return results
+
+
+# --- Reporting ---------------------------------------------------------------
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(results, duration):
+    summary = {}
+    for endpoint, samples in sorted(results.samples.items()):
+        samples.sort()
+        summary[endpoint] = {
+            "requests": len(samples),
+            "errors": results.errors.get(endpoint, 0),
+            "rps": round(len(samples) / duration, 2),
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        }
+    return summary
+
+
+def print_summary(summary, baseline=None, tolerance=10.0):
+    """Table per endpoint; with a baseline, p95 and throughput deltas too. Returns the regressions."""
+    regressions = []
+    header = f"{'endpoint':<34} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    if baseline:
+        header += f" {'p95 vs base':>12} {'rps vs base':>12}"
+    print(header)
+    for endpoint, s in summary.items():
+        line = (f"{endpoint:<34} {s['requests']:>7} {s['errors']:>5} {s['rps']:>8.1f} "
+                f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}")
+        base = (baseline or {}).get(endpoint)
+        if base:
+            p95_delta = (s["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+            rps_delta = (s["rps"] - base["rps"]) / base["rps"] * 100 if base["rps"] else 0.0
+            line += f" {p95_delta:>+11.1f}% {rps_delta:>+11.1f}%"
+            if p95_delta > tolerance:
+                regressions.append(endpoint)
+                line += "  REGRESSION"
+        print(line)
+    total = sum(s["requests"] for s in summary.values())
+    errors = sum(s["errors"] for s in summary.values())
+    print(f"\n{total} requests, {errors} errors, {sum(s['rps'] for s in summary.values()):.1f} req/s overall")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic data and load-test the FolkMint API")
+    parser.add_argument("--seed", action="store_true", help="load a synthetic dataset (generate_data.py) and exit")
+    add_size_arguments(parser, users=200, products=2000, reviews=10000, orders=5000)
+    parser.add_argument("--url", default=os.getenv("BENCH_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--vus", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before recording")
+    parser.add_argument("--think-time", type=float, default=0, help="mean pause between scenarios, seconds")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIO_WEIGHTS), default=list(SCENARIO_WEIGHTS))
+    parser.add_argument("--save-baseline", metavar="FILE", help="write the results as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="p95 increase in %% that counts as a regression")
+    args = parser.parse_args()
+
+    if args.seed:
+        load(args)
+        return
+
+    ctx = load_context()
+    print(f"--- {args.vus} virtual users for {args.duration:.0f}s against {args.url} ({', '.join(args.scenarios)}) ---")
+    results = asyncio.run(run_load(args, ctx))
+    summary = summarize(results, args.duration)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["endpoints"]
+    regressions = print_summary(summary, baseline, args.tolerance)
+
+    if args.save_baseline:
+        meta = {k: getattr(args, k) for k in ("url", "vus", "duration", "think_time", "scenarios", "random_seed")}
+        with open(args.save_baseline, "w") as f:
+            json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "meta": meta, "endpoints": summary}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if regressions:
+        sys.exit(f"p95 regressed more than {args.tolerance}% on: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
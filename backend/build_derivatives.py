@@ -0,0 +1,74 @@
+import os
+import json
+import psycopg2
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from images import UPLOADS_DIR, IMAGES_DIR, DERIVED_DIR, IMAGE_EXTENSIONS, generate_derivatives, existing_derivatives
+
+load_dotenv('.env')
+
+
+def asset_urls():
+    """Every original image under uploads/ and gemini_img/, as the URL it is served at."""
+    for prefix, root in (("/uploads/", UPLOADS_DIR), ("/images/", IMAGES_DIR)):
+        for dirpath, dirnames, filenames in os.walk(root):
+            if os.path.abspath(dirpath) == os.path.abspath(DERIVED_DIR):
+                dirnames[:] = []
+                continue
+            for name in filenames:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    rel = os.path.relpath(os.path.join(dirpath, name), root).replace('\\', '/')
+                    yield prefix + rel
+
+
+def _generate(url):
+    try:
+        return url, generate_derivatives(url), None
+    except Exception as e:
+        return url, None, e
+
+
+def build_all():
+    """Generate derivatives for the whole asset tree, then link them to product_image rows.
+
+    Rows are relinked whenever their thumbnail differs from the current one,
+    which picks up sources replaced in place (their derivative names change).
+    """
+    urls = list(asset_urls())
+    print(f"--- Generating derivatives for {len(urls)} images ---")
+    described = {}
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        for done, (url, derived, err) in enumerate(pool.map(_generate, urls), 1):
+            if err:
+                print(f"  ! {url}: {err}")
+            elif derived:
+                described[url] = derived
+            if done % 50 == 0:
+                print(f"  {done}/{len(urls)}")
+
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST'), database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'), password=os.getenv('DB_PASSWORD'), port=os.getenv('DB_PORT')
+    )
+    cur = conn.cursor()
+    cur.execute("SELECT image_id, image_url, thumbnail_url FROM product_image")
+    updates = []
+    for image_id, image_url, thumbnail_url in cur.fetchall():
+        derived = described.get(image_url) or existing_derivatives(image_url)
+        if derived and derived["thumbnail_url"] != thumbnail_url:
+            updates.append((image_id, derived["thumbnail_url"], json.dumps(derived["derivatives"])))
+
+    execute_values(cur, """
+        UPDATE product_image pi
+        SET thumbnail_url = v.thumbnail_url, derivatives = v.derivatives::jsonb
+        FROM (VALUES %s) AS v(image_id, thumbnail_url, derivatives)
+        WHERE pi.image_id = v.image_id
+    """, updates, page_size=1000)
+    conn.commit()
+    conn.close()
+    print(f"--- Linked derivatives to {len(updates)} product images ---")
+
+
+if __name__ == "__main__":
+    build_all()
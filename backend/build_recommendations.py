@@ -0,0 +1,170 @@
+# Offline recommendation builder.
+#
+#   python build_recommendations.py                  # rebuild once (cron it)
+#   python build_recommendations.py --every 3600     # or keep rebuilding hourly
+#
+# Item-item similarity is computed in batch from two sparse user x product
+# matrices: who bought what (order_item, cancelled orders excluded) and who
+# rated what (review, centred on 3 stars so a 1-star review counts against
+# similarity). Each is cosine-normalized per product and the two products
+# X.T @ X are blended, keeping the top --neighbors per product. A user's
+# scores are their own purchases and good ratings times that neighbourhood,
+# minus what they already bought or reviewed. The top-K for every product
+# and user are written to product_recommendation / user_recommendation
+# (migrate_perf section 10), which the API only reads.
+import argparse
+import time
+import numpy as np
+from scipy import sparse
+from generate_data import connect, copy_rows
+
+PURCHASES_QUERY = """
+    SELECT o.user_id, pv.product_id, SUM(oi.quantity)
+    FROM order_item oi
+    JOIN orders o ON o.order_id = oi.order_id
+    JOIN product_variant pv ON pv.variant_id = oi.variant_id
+    WHERE LOWER(o.status) <> 'cancelled'
+    GROUP BY o.user_id, pv.product_id
+"""
+
+RATINGS_QUERY = "SELECT user_id, product_id, rating FROM review"
+
+# rating counted as a like when building a user's profile
+LIKED_RATING = 4
+
+
+def load_interactions(cur):
+    cur.execute(PURCHASES_QUERY)
+    purchases = np.array(cur.fetchall(), dtype=np.int64).reshape(-1, 3)
+    cur.execute(RATINGS_QUERY)
+    ratings = np.array(cur.fetchall(), dtype=np.int64).reshape(-1, 3)
+    return purchases, ratings
+
+
+def index_ids(*columns):
+    """Sorted unique ids across the columns, and each column mapped to positions in it."""
+    ids = np.unique(np.concatenate(columns))
+    return ids, [np.searchsorted(ids, c) for c in columns]
+
+
+def cosine_similarity(matrix):
+    """Product x product cosine similarity of a user x product matrix, diagonal removed."""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1.0
+    normalized = matrix @ sparse.diags(1.0 / norms)
+    similarity = (normalized.T @ normalized).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+    return similarity
+
+
+def top_k(matrix, k, exclude=None):
+    """(row, column, score) of the k best positive entries per row of a CSR matrix.
+
+    Entries present in `exclude` (same shape) are skipped.
+    """
+    matrix = matrix.tocsr()
+    if exclude is not None:
+        # zero out excluded cells without densifying
+        mask = exclude.tocsr().astype(bool).astype(matrix.dtype)
+        matrix = (matrix - matrix.multiply(mask)).tocsr()
+        matrix.eliminate_zeros()
+    rows, columns, scores = [], [], []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        data = matrix.data[start:end]
+        keep = np.flatnonzero(data > 0)
+        if len(keep) > k:
+            keep = keep[np.argpartition(-data[keep], k - 1)[:k]]
+        keep = keep[np.argsort(-data[keep], kind="stable")]
+        rows.append(np.full(len(keep), row))
+        columns.append(matrix.indices[start:end][keep])
+        scores.append(data[keep])
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([])
+    return np.concatenate(rows), np.concatenate(columns), np.concatenate(scores)
+
+
+def ranked(owner_ids, item_ids, rows, columns, scores):
+    """Rows for a recommendation table: (owner, rank from 1, item, score)."""
+    rank = 0
+    previous = None
+    for row, column, score in zip(rows, columns, scores):
+        rank = rank + 1 if row == previous else 1
+        previous = row
+        yield int(owner_ids[row]), rank, int(item_ids[column]), round(float(score), 6)
+
+
+def build(args):
+    started = time.perf_counter()
+    conn = connect()
+    cur = conn.cursor()
+    purchases, ratings = load_interactions(cur)
+    if not len(purchases) and not len(ratings):
+        print("No orders or reviews yet, nothing to build")
+        conn.close()
+        return
+
+    user_ids, (purchase_users, rating_users) = index_ids(purchases[:, 0], ratings[:, 0])
+    product_ids, (purchase_products, rating_products) = index_ids(purchases[:, 1], ratings[:, 1])
+    shape = (len(user_ids), len(product_ids))
+
+    # binary co-purchase: quantity says little about similarity
+    bought = sparse.csr_matrix(
+        (np.ones(len(purchases)), (purchase_users, purchase_products)), shape=shape
+    )
+    # centred ratings, duplicates (shouldn't exist) summed by the constructor
+    rated = sparse.csr_matrix(
+        (ratings[:, 2] - 3.0, (rating_users, rating_products)), shape=shape
+    )
+    rated.eliminate_zeros()
+
+    similarity = (args.purchase_weight * cosine_similarity(bought)
+                  + (1 - args.purchase_weight) * cosine_similarity(rated))
+    rows, columns, scores = top_k(similarity, args.neighbors)
+    neighbors = sparse.csr_matrix((scores, (rows, columns)), shape=(shape[1], shape[1]))
+
+    stars = sparse.csr_matrix((ratings[:, 2].astype(float), (rating_users, rating_products)), shape=shape)
+    reviewed = sparse.csr_matrix((np.ones(len(ratings)), (rating_users, rating_products)), shape=shape)
+    profile = (bought + (stars >= LIKED_RATING)).tocsr()
+    profile.data[:] = 1.0
+    seen = bought + reviewed
+
+    product_rows = list(ranked(product_ids, product_ids, *top_k(neighbors, args.k)))
+    user_rows = list(ranked(user_ids, product_ids, *top_k(profile @ neighbors, args.k, exclude=seen)))
+    print(f"--- {shape[0]} users, {shape[1]} products, {similarity.nnz} similar pairs "
+          f"({time.perf_counter() - started:.1f}s) ---")
+
+    # replace both tables in one transaction; readers keep the old set until commit
+    cur.execute("DELETE FROM product_recommendation")
+    cur.execute("DELETE FROM user_recommendation")
+    copy_rows(cur, "product_recommendation", ("product_id", "rank", "recommended_id", "score"), product_rows)
+    copy_rows(cur, "user_recommendation", ("user_id", "rank", "product_id", "score"), user_rows)
+    conn.commit()
+    conn.close()
+    print(f"--- Recommendations rebuilt in {time.perf_counter() - started:.1f}s ---")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the precomputed product and user recommendations")
+    parser.add_argument("--k", type=int, default=20, help="recommendations stored per product and per user")
+    parser.add_argument("--neighbors", type=int, default=50, help="similar products kept per product for scoring")
+    parser.add_argument("--purchase-weight", type=float, default=0.7,
+                        help="share of co-purchase vs co-rating similarity, 0..1")
+    parser.add_argument("--every", type=float, default=0, metavar="SECONDS", help="rebuild on this interval")
+    args = parser.parse_args()
+
+    while True:
+        try:
+            build(args)
+        except Exception as e:
+            if not args.every:
+                raise
+            print(f"Error building recommendations: {e}")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
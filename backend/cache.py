@@ -0,0 +1,211 @@
+# Read-through response cache for the public catalog endpoints.
+# Entries are keyed by route + query params and tagged (e.g. "products",
+# "product:12", "category:3") so write paths can drop exactly what they
+# made stale. The default backend is an in-process LRU with TTL; set
+# CACHE_URL=redis://... to share entries and invalidations between workers.
+# With several workers (WEB_CONCURRENCY > 1) and no Redis, caching is off.
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from fastapi.concurrency import run_in_threadpool
+
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_URL = os.getenv("CACHE_URL", "")
+# uvicorn reads its --workers default from here too
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+class MemoryBackend:
+    """LRU dict with per-entry expiry, local to this worker."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, tags):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def size(self):
+        return len(self._entries)
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    """Shared backend; tags are Redis sets of the keys that carry them."""
+
+    name = "redis"
+    # network round trips, async routes must not run them on the event loop
+    blocking = True
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed when CACHE_URL is set
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._redis.get(f"cache:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl, tags):
+        pipe = self._redis.pipeline()
+        pipe.setex(f"cache:{key}", ttl, json.dumps(value, default=str))
+        for tag in tags:
+            pipe.sadd(f"tag:{tag}", key)
+            pipe.expire(f"tag:{tag}", ttl * 2)
+        pipe.execute()
+
+    def invalidate_tags(self, tags):
+        tag_keys = [f"tag:{tag}" for tag in tags]
+        keys = self._redis.sunion(tag_keys)
+        pipe = self._redis.pipeline()
+        for key in keys:
+            pipe.delete(f"cache:{key.decode()}")
+        pipe.delete(*tag_keys)
+        pipe.execute()
+        return len(keys)
+
+    def size(self):
+        return None
+
+
+class NullBackend:
+    """No caching: per-worker memory caches cannot see each other's invalidations."""
+
+    name = "disabled"
+    blocking = False
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl, tags):
+        pass
+
+    def invalidate_tags(self, tags):
+        return 0
+
+    def size(self):
+        return 0
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl=CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(route, **params):
+        query = urlencode(sorted((k, v) for k, v in params.items() if v is not None))
+        return f"{route}?{query}"
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Cache read failed: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, tags, ttl=None):
+        try:
+            self.backend.set(key, value, ttl or self.ttl, tuple(tags))
+        except Exception as e:
+            print(f"Cache write failed: {e}")
+
+    async def get_async(self, key):
+        """get() for async routes; a blocking backend runs in the threadpool."""
+        if self.backend.blocking:
+            return await run_in_threadpool(self.get, key)
+        return self.get(key)
+
+    async def set_async(self, key, value, tags, ttl=None):
+        if self.backend.blocking:
+            return await run_in_threadpool(self.set, key, value, tags, ttl)
+        return self.set(key, value, tags, ttl)
+
+    def invalidate(self, *tags):
+        try:
+            dropped = self.backend.invalidate_tags(tags)
+        except Exception as e:
+            print(f"Cache invalidation failed: {e}")
+            return
+        with self._lock:
+            self.invalidations += dropped
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidated": self.invalidations,
+        }
+
+
+def _make_backend():
+    if CACHE_URL:
+        try:
+            return RedisBackend(CACHE_URL)
+        except Exception as e:
+            print(f"Shared cache unavailable: {e}")
+    if WORKERS > 1:
+        # a write only clears the worker that served it, the others would serve stale stock
+        print(f"Response cache disabled: {WORKERS} workers need a shared cache (set CACHE_URL)")
+        return NullBackend()
+    return MemoryBackend()
+
+
+response_cache = ResponseCache(_make_backend())
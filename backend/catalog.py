@@ -0,0 +1,225 @@
+# Catalog hydration: loads variants, images and rating aggregates for a whole
+# page of products in a fixed number of set-based queries instead of running
+# one lookup per product. Shared by every product listing endpoint.
+import base64
+import json
+
+VARIANTS_QUERY = """
+    SELECT * FROM product_variant
+    WHERE product_id = ANY(%s)
+    ORDER BY product_id, variant_id
+"""
+
+MAIN_IMAGE_QUERY = """
+    SELECT DISTINCT ON (pv.product_id) pv.product_id, pi.image_url, pi.thumbnail_url
+    FROM product_image pi
+    JOIN product_variant pv ON pi.variant_id = pv.variant_id
+    WHERE pv.product_id = ANY(%s)
+    ORDER BY pv.product_id, pv.variant_id, pi.image_id
+"""
+
+ALL_IMAGES_QUERY = """
+    SELECT pv.product_id, pi.image_url, pi.thumbnail_url
+    FROM product_image pi
+    JOIN product_variant pv ON pi.variant_id = pv.variant_id
+    WHERE pv.product_id = ANY(%s)
+    ORDER BY pv.product_id, pv.variant_id, pi.image_id
+"""
+
+# rating_sum/rating_count are kept current by a trigger on review (migrate_perf)
+RATINGS_QUERY = """
+    SELECT product_id, rating_sum, rating_count
+    FROM product
+    WHERE product_id = ANY(%s)
+"""
+
+
+PRODUCT_COLUMNS = ("product_id", "name", "description", "base_price", "category_id", "seller_id")
+HYDRATED_FIELDS = ("variants", "main_image", "main_image_thumb", "average_rating", "total_reviews")
+RATING_COLUMNS = ("rating_sum", "rating_count")
+MAX_PAGE_LIMIT = 100
+
+
+def parse_fields(fields):
+    """Parse a comma separated `fields=` projection; None means every field."""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(PRODUCT_COLUMNS) - set(HYDRATED_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    # product_id is always returned, it is the pagination key
+    requested.add("product_id")
+    return requested
+
+
+def wants_ratings(requested):
+    return requested is None or "average_rating" in requested or "total_reviews" in requested
+
+
+def select_columns(requested, prefix=""):
+    """Product columns for a projection, plus the rating counters when needed."""
+    columns = [c for c in PRODUCT_COLUMNS if requested is None or c in requested]
+    if wants_ratings(requested):
+        columns.extend(RATING_COLUMNS)
+    return ", ".join(prefix + c for c in columns)
+
+
+def average_rating(rating_sum, rating_count):
+    return round(rating_sum / rating_count, 1) if rating_count else 0.0
+
+
+def _field_options(requested):
+    return dict(
+        variants="variants" in requested,
+        ratings=wants_ratings(requested),
+        main_image="main_image" in requested or "main_image_thumb" in requested,
+    )
+
+
+def _project(products, requested):
+    for p in products:
+        for key in [k for k in p if k not in requested]:
+            del p[key]
+    return products
+
+
+async def hydrate_fields_async(cursor, products, requested):
+    """Hydrate only what a `fields=` projection asked for, then drop the rest."""
+    if requested is None:
+        return await hydrate_products_async(cursor, products)
+    await hydrate_products_async(cursor, products, **_field_options(requested))
+    return _project(products, requested)
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def page_limit(limit):
+    if limit is None:
+        return None
+    return max(1, min(limit, MAX_PAGE_LIMIT))
+
+
+def paginate(rows, limit, key):
+    """Trim a LIMIT n+1 result to n rows and build the cursor for the next page."""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
+
+
+def _group_by(rows, key):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row[key], []).append(row)
+    return grouped
+
+
+def _apply_variants(products, rows):
+    variants_by_product = _group_by(rows, "product_id")
+    for p in products:
+        product_variants = variants_by_product.get(p["product_id"], [])
+        for v in product_variants:
+            v["price"] = float(v["price"])
+            v.pop('created_at', None)
+            v.pop('updated_at', None)
+        p["variants"] = product_variants
+
+
+def _apply_all_images(products, rows):
+    images_by_product = _group_by(rows, "product_id")
+    for p in products:
+        rows = images_by_product.get(p["product_id"], [])
+        p["images"] = list(dict.fromkeys(row["image_url"] for row in rows))
+        p["main_image"] = rows[0]["image_url"] if rows else None
+        p["main_image_thumb"] = (rows[0]["thumbnail_url"] or rows[0]["image_url"]) if rows else None
+
+
+def _apply_main_images(products, rows):
+    main_images = {row["product_id"]: row for row in rows}
+    for p in products:
+        row = main_images.get(p["product_id"])
+        p["main_image"] = row["image_url"] if row else None
+        p["main_image_thumb"] = (row["thumbnail_url"] or row["image_url"]) if row else None
+
+
+def _apply_ratings(products, rows):
+    ratings_by_product = {row["product_id"]: row for row in rows}
+    for p in products:
+        if "rating_count" not in p:
+            counters = ratings_by_product.get(p["product_id"], {})
+            p["rating_sum"] = counters.get("rating_sum", 0)
+            p["rating_count"] = counters.get("rating_count", 0)
+
+
+def _hydration_plan(products, variants, ratings, images, main_image):
+    """The (query, params, apply) steps hydrating these products needs.
+
+    Shared by the sync and async hydrators so both issue the same queries.
+    """
+    for p in products:
+        if "base_price" in p:
+            p["base_price"] = float(p["base_price"])
+
+    product_ids = [p["product_id"] for p in products]
+    plan = []
+    if variants:
+        plan.append((VARIANTS_QUERY, (product_ids,), _apply_variants))
+    if images:
+        plan.append((ALL_IMAGES_QUERY, (product_ids,), _apply_all_images))
+    elif main_image:
+        plan.append((MAIN_IMAGE_QUERY, (product_ids,), _apply_main_images))
+    if ratings:
+        # rows selected with select_columns() already carry the counters
+        missing = [p["product_id"] for p in products if "rating_count" not in p]
+        if missing:
+            plan.append((RATINGS_QUERY, (missing,), _apply_ratings))
+    return plan
+
+
+def _finish(products, ratings):
+    for p in products:
+        if ratings:
+            p["average_rating"] = average_rating(p.get("rating_sum", 0), p.get("rating_count", 0))
+            p["total_reviews"] = p.get("rating_count", 0)
+        for column in RATING_COLUMNS:
+            p.pop(column, None)
+    return products
+
+
+def hydrate_products(cursor, products, variants=True, ratings=True, images=False, main_image=True):
+    """Attach catalog data to product rows in place and return them.
+
+    main_image is the first image of the lowest variant that has one and
+    main_image_thumb its small derivative (falls back to the original).
+    variants adds the variant list, ratings adds average_rating/total_reviews
+    and images adds every distinct image url (and implies main_image). Runs
+    at most one query per enabled part no matter how many products are
+    passed; ratings are free when the rows already carry rating_sum and
+    rating_count. The cursor must be a RealDictCursor.
+    """
+    if not products:
+        return products
+    for query, params, apply in _hydration_plan(products, variants, ratings, images, main_image):
+        cursor.execute(query, params)
+        apply(products, cursor.fetchall())
+    return _finish(products, ratings)
+
+
+async def hydrate_products_async(cursor, products, variants=True, ratings=True, images=False, main_image=True):
+    """hydrate_products() for an async cursor returning dict rows (async_database)."""
+    if not products:
+        return products
+    for query, params, apply in _hydration_plan(products, variants, ratings, images, main_image):
+        await cursor.execute(query, params)
+        apply(products, await cursor.fetchall())
+    return _finish(products, ratings)
@@ -0,0 +1,234 @@
+# Managed psycopg2 pool behind get_db.
+# Bounded checkout with a timeout (a full pool fails fast with a 503 instead
+# of queueing forever), a liveness check for connections that sat idle,
+# recycling of connections past a max lifetime, and counters/wait-time
+# histogram for /api/health so workers can be sized against max_connections.
+import os
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions, pool
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from sql_trace import observe, log_plan, explain_prefix
+
+load_dotenv()
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# connections idle longer than this are pinged before being handed out
+DB_POOL_CHECK_IDLE = float(os.getenv("DB_POOL_CHECK_IDLE", "30"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+
+# upper bounds in milliseconds, the last bucket is +Inf
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+_timed_cursors = {}
+
+
+def _timed_cursor(base):
+    """Subclass of a cursor class that reports every statement to sql_trace/metrics."""
+    if base not in _timed_cursors:
+        class TimedCursor(base):
+            def execute(self, query, vars=None):
+                started = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    if observe(query, vars, time.perf_counter() - started):
+                        self._explain(query, vars)
+
+            def executemany(self, query, vars_list):
+                started = time.perf_counter()
+                try:
+                    return super().executemany(query, vars_list)
+                finally:
+                    observe(query, None, time.perf_counter() - started)
+
+            def callproc(self, procname, parameters=None):
+                started = time.perf_counter()
+                try:
+                    return super().callproc(procname, parameters)
+                finally:
+                    observe(procname, parameters, time.perf_counter() - started)
+
+            def _explain(self, query, vars):
+                # plain cursor so the EXPLAIN itself is not timed or explained again
+                try:
+                    with extensions.cursor(self.connection) as cur:
+                        cur.execute(explain_prefix(query) + self.mogrify(query, vars).decode())
+                        log_plan(cur.fetchall())
+                except psycopg2.Error as e:
+                    print(f"  EXPLAIN failed: {e}")
+
+        TimedCursor.__name__ = f"Timed{base.__name__}"
+        _timed_cursors[base] = TimedCursor
+    return _timed_cursors[base]
+
+
+class InstrumentedConnection(extensions.connection):
+    """Hands out timed cursors, whatever cursor_factory the caller asks for."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = _timed_cursor(base)
+        return super().cursor(*args, **kwargs)
+
+
+def _connect_params():
+    if os.getenv("DATABASE_URL"):
+        return {"dsn": os.getenv("DATABASE_URL"), "connection_factory": InstrumentedConnection}
+    return {
+        "connection_factory": InstrumentedConnection,
+        "host": os.getenv("DB_HOST"), "database": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"), "password": os.getenv("DB_PASSWORD"), "port": os.getenv("DB_PORT"),
+    }
+
+
+class ManagedPool:
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 check_idle=DB_POOL_CHECK_IDLE, max_lifetime=DB_POOL_MAX_LIFETIME, **params):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.max_lifetime = max_lifetime
+        self._params = params
+        self._pool = None
+        # ThreadedConnectionPool raises instead of waiting when exhausted,
+        # the semaphore turns that into a bounded wait
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._born = {}  # id(conn) -> created at
+        self._returned = {}  # id(conn) -> last put back at
+        self.in_use = 0
+        self.counters = {"checkouts": 0, "timeouts": 0, "opened": 0, "recycled": 0, "broken": 0}
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_sum_ms = 0.0
+
+    def open(self):
+        if self._pool is None:
+            self._pool = pool.ThreadedConnectionPool(self.minconn, self.maxconn, **self._params)
+        return self
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    def _observe_wait(self, waited_ms):
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if waited_ms <= bound:
+                break
+        else:
+            i = len(WAIT_BUCKETS_MS)
+        self.wait_buckets[i] += 1
+        self.wait_sum_ms += waited_ms
+
+    def _is_stale(self, conn, now):
+        if conn.closed:
+            return True
+        key = id(conn)
+        if key not in self._born:
+            self._born[key] = now
+            self.counters["opened"] += 1
+            return False
+        if now - self._born[key] > self.max_lifetime:
+            return True
+        if now - self._returned.get(key, now) > self.check_idle:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return True
+        return False
+
+    def getconn(self):
+        self.open()
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.counters["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        try:
+            while True:
+                conn = self._pool.getconn()
+                now = time.monotonic()
+                if not self._is_stale(conn, now):
+                    break
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.counters["checkouts"] += 1
+            self._observe_wait((now - started) * 1000)
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self.counters["recycled" if not conn.closed else "broken"] += 1
+        self._born.pop(id(conn), None)
+        self._returned.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def putconn(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            # never hand the next request a connection with an open transaction
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if time.monotonic() - self._born.get(id(conn), 0) > self.max_lifetime:
+                self._discard(conn)
+                return
+            self._returned[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        idle = len(self._pool._pool) if self._pool is not None else 0
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(list(WAIT_BUCKETS_MS) + ["+Inf"], self.wait_buckets):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self.in_use,
+                "idle": idle,
+                **self.counters,
+                "wait_ms": {"buckets": buckets, "sum": round(self.wait_sum_ms, 3), "count": cumulative},
+            }
+
+
+db_pool = ManagedPool(**_connect_params())
+
+
+def get_db():
+    """Request-scoped connection; a 503 when the pool stays exhausted."""
+    try:
+        conn = db_pool.getconn()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except psycopg2.OperationalError as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {e}")
+    try:
+        yield conn
+    finally:
+        db_pool.putconn(conn)
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+from images import UPLOADS_DIR, derivative_paths
+
+load_dotenv('.env')
+
+# Columns holding /uploads/... URLs besides product_image (counted in image_blob).
+# users.profile_picture_url is written by the auth/admin routes but not declared
+# in schema.sql, so a database without it is skipped.
+EXTRA_REFERENCES = [("users", "profile_picture_url")]
+
+
+def referenced_urls(cur):
+    cur.execute("SELECT image_url FROM image_blob WHERE ref_count > 0")
+    urls = {row[0] for row in cur.fetchall()}
+    for table, column in EXTRA_REFERENCES:
+        cur.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+            (table, column)
+        )
+        if cur.fetchone():
+            cur.execute(f"SELECT DISTINCT {column} FROM {table} WHERE {column} LIKE '/uploads/%%'")
+            urls.update(row[0] for row in cur.fetchall())
+    return urls
+
+
+def collect_garbage(grace_hours, dry_run):
+    """Delete uploads/ files (and their derivatives) that nothing references.
+
+    Files younger than the grace period are kept: they may have just been
+    uploaded by a seller who has not saved the product yet.
+    """
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST'), database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'), password=os.getenv('DB_PASSWORD'), port=os.getenv('DB_PORT')
+    )
+    cur = conn.cursor()
+    referenced = referenced_urls(cur)
+    conn.close()
+
+    cutoff = time.time() - grace_hours * 3600
+    removed, freed = 0, 0
+    for name in os.listdir(UPLOADS_DIR):
+        path = os.path.join(UPLOADS_DIR, name)
+        if not os.path.isfile(path) or os.path.getmtime(path) > cutoff:
+            continue
+        url = f"/uploads/{name}"
+        # leftovers of interrupted uploads are always garbage
+        if url in referenced and not name.endswith(".part"):
+            continue
+        for victim in [path] + [p for p in derivative_paths(url) if os.path.exists(p)]:
+            freed += os.path.getsize(victim)
+            removed += 1
+            print(f"  - {os.path.relpath(victim, UPLOADS_DIR)}")
+            if not dry_run:
+                os.remove(victim)
+
+    action = "Would remove" if dry_run else "Removed"
+    print(f"{action} {removed} files ({freed / (1024 * 1024):.1f}MB) from {UPLOADS_DIR}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Garbage-collect unreferenced uploaded images")
+    parser.add_argument("--grace-hours", type=float, default=24, help="keep files younger than this")
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be removed")
+    args = parser.parse_args()
+    if not os.path.isdir(UPLOADS_DIR):
+        sys.exit(f"No uploads directory at {UPLOADS_DIR}")
+    collect_garbage(args.grace_hours, args.dry_run)
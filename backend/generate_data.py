@@ -0,0 +1,303 @@
+# Bulk synthetic dataset for scale testing.
+#
+#   python generate_data.py --products 1000000 --users 200000 --reviews 3000000 --orders 1000000
+#
+# Rows are generated on the fly and streamed into Postgres with
+# COPY ... FROM STDIN, one COPY per table, so nothing is materialized in
+# Python beyond a few id/price arrays. Primary keys are reserved up front by
+# advancing each table's sequence, which lets child rows (variants, images,
+# reviews, order items) point at their parents without reading anything back.
+# Accounts use the benchmark.py email domain and password, so the load test
+# can log in as any generated user and --reseed removes everything again.
+# Needs schema.sql, migrate_cse and migrate_perf applied first.
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from array import array
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+BENCH_EMAIL_DOMAIN = "bench.folkmint.test"
+BENCH_PASSWORD = "benchpass123"
+BENCH_CATEGORY_PREFIX = "Bench "
+
+ADJECTIVES = ["handwoven", "painted", "carved", "embroidered", "glazed", "rustic", "heritage", "festive", "miniature", "royal"]
+MATERIALS = ["jamdani", "nakshi", "kantha", "terracotta", "bamboo", "brass", "jute", "clay", "silk", "rosewood", "shital", "conch"]
+NOUNS = ["saree", "vase", "basket", "lamp", "bangle", "tray", "mat", "wall hanging", "pot", "sculpture", "cushion", "mask"]
+COLORS = ["Red", "Indigo", "Ivory", "Ochre", "Green", "Black"]
+SIZES = ["Small", "Medium", "Large"]
+CITIES = ["Dhaka", "Chattogram", "Khulna", "Rajshahi", "Sylhet", "Barishal"]
+STATUSES = ["delivered"] * 6 + ["shipped", "Processing"]
+PLACEHOLDER_IMAGE = "https://images.unsplash.com/photo-1582555172866-f73bb12a2ab3?auto=format&fit=crop&q=80&w=800"
+
+# Row triggers that would turn COPY back into per-row work; their effect is
+# recomputed in one statement after the load (see finish()).
+DEFERRED_TRIGGERS = [("review", "trigger_product_rating"), ("product_image", "trigger_image_refs")]
+
+# bytes handed to COPY per read
+COPY_CHUNK = 1 << 20
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST'), database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'), password=os.getenv('DB_PASSWORD'), port=os.getenv('DB_PORT')
+    )
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+class RowStream(io.RawIOBase):
+    """File-like view of a row generator in COPY text format, read lazily by copy_expert."""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = b""
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=COPY_CHUNK):
+        if size is None or size < 0:
+            size = COPY_CHUNK
+        parts, length = [self._buffer], len(self._buffer)
+        while length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = ("\t".join(_copy_value(v) for v in row) + "\n").encode()
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+        data = b"".join(parts)
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(cur, table, columns, rows):
+    started = time.perf_counter()
+    stream = RowStream(iter(rows))
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream, size=COPY_CHUNK)
+    elapsed = time.perf_counter() - started
+    print(f"  {table:<16} {stream.count:>10} rows  {elapsed:6.1f}s  ({stream.count / max(elapsed, 1e-6):,.0f} rows/s)")
+    return stream.count
+
+
+def reserve_ids(cur, table, column, count):
+    """First id of a block of `count` ids taken from the table's serial sequence."""
+    cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, column))
+    sequence = cur.fetchone()[0]
+    cur.execute(f"SELECT GREATEST((SELECT last_value FROM {sequence}), (SELECT COALESCE(MAX({column}), 0) FROM {table}))")
+    last = cur.fetchone()[0]
+    cur.execute("SELECT setval(%s, %s)", (sequence, last + max(count, 1)))
+    return last + 1
+
+
+def _timestamp(rng, now, days=365):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - rng.random() * days * 86400))
+
+
+def generate(cur, args):
+    """Stream every table in dependency order. Returns {table: rows}."""
+    rng = random.Random(args.random_seed)
+    now = time.time()
+    counts = {}
+    n_sellers = args.sellers or max(1, args.users // 20)
+    n_parents = args.categories
+    n_categories = n_parents * (1 + args.subcategories)
+
+    # lock out concurrent inserts while ids are reserved and used
+    cur.execute("LOCK TABLE users, address, category, product, product_variant, product_image, review, orders, order_item IN SHARE ROW EXCLUSIVE MODE")
+    first_user = reserve_ids(cur, "users", "user_id", n_sellers + args.users)
+    first_address = reserve_ids(cur, "address", "address_id", args.users)
+    first_category = reserve_ids(cur, "category", "category_id", n_categories)
+    first_product = reserve_ids(cur, "product", "product_id", args.products)
+    first_variant = reserve_ids(cur, "product_variant", "variant_id", args.products * args.variants_per_product)
+    first_image = reserve_ids(cur, "product_image", "image_id", args.products * args.variants_per_product * args.images_per_variant)
+    first_review = reserve_ids(cur, "review", "review_id", args.reviews)
+    first_order = reserve_ids(cur, "orders", "order_id", args.orders)
+    seller_ids = range(first_user, first_user + n_sellers)
+    customer_ids = range(first_user + n_sellers, first_user + n_sellers + args.users)
+
+    from auth_utils import get_password_hash
+    password_hash = get_password_hash(BENCH_PASSWORD)
+
+    def users():
+        for i, user_id in enumerate(seller_ids):
+            yield (user_id, f"bench_seller_{i}", f"seller{i}@{BENCH_EMAIL_DOMAIN}", password_hash, "Bench", f"Seller{i}", "seller", _timestamp(rng, now, 730))
+        for i, user_id in enumerate(customer_ids):
+            yield (user_id, f"bench_user_{i}", f"user{i}@{BENCH_EMAIL_DOMAIN}", password_hash, "Bench", f"User{i}", "customer", _timestamp(rng, now, 730))
+    counts["users"] = copy_rows(cur, "users", ["user_id", "username", "email", "password_hash", "first_name", "last_name", "role", "created_at"], users())
+
+    def addresses():
+        for i, user_id in enumerate(customer_ids):
+            yield (first_address + i, f"{rng.randint(1, 300)} Bench Road", rng.choice(CITIES), str(rng.randint(1000, 9999)), "Bangladesh", user_id)
+    counts["address"] = copy_rows(cur, "address", ["address_id", "street", "city", "postal_code", "country", "user_id"], addresses())
+
+    # category tree: parents first, then their subcategories
+    leaf_categories = []
+
+    def categories():
+        for p in range(n_parents):
+            parent_id = first_category + p
+            yield (parent_id, f"{BENCH_CATEGORY_PREFIX}{NOUNS[p % len(NOUNS)].title()} {p}", None)
+        for p in range(n_parents):
+            for s in range(args.subcategories):
+                category_id = first_category + n_parents + p * args.subcategories + s
+                leaf_categories.append(category_id)
+                yield (category_id, f"{BENCH_CATEGORY_PREFIX}{MATERIALS[s % len(MATERIALS)].title()} {p}.{s}", first_category + p)
+    counts["category"] = copy_rows(cur, "category", ["category_id", "name", "parent_category"], categories())
+    if not leaf_categories:
+        leaf_categories = list(range(first_category, first_category + n_parents))
+
+    # variant prices are needed again for order lines, kept as a compact int array
+    variant_prices = array("i")
+
+    def products():
+        for i in range(args.products):
+            name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(MATERIALS).title()} {rng.choice(NOUNS).title()} {i}"
+            price = rng.randint(300, 15000)
+            variant_prices.extend(price + rng.choice((0, 0, 150, 300)) for _ in range(args.variants_per_product))
+            yield (first_product + i, name, f"Authentic {name.lower()} made by a bench artisan.", price,
+                   rng.choice(leaf_categories), rng.choice(seller_ids), _timestamp(rng, now))
+    counts["product"] = copy_rows(cur, "product", ["product_id", "name", "description", "base_price", "category_id", "seller_id", "created_at"], products())
+
+    n_variants = args.products * args.variants_per_product
+
+    def variants():
+        for v in range(n_variants):
+            yield (first_variant + v, first_product + v // args.variants_per_product, rng.choice(SIZES), rng.choice(COLORS),
+                   rng.randint(0, 500), variant_prices[v])
+    counts["product_variant"] = copy_rows(cur, "product_variant", ["variant_id", "product_id", "size", "color", "stock_quantity", "price"], variants())
+
+    def images():
+        for v in range(n_variants):
+            for k in range(args.images_per_variant):
+                yield (first_image + v * args.images_per_variant + k, PLACEHOLDER_IMAGE, first_variant + v)
+    counts["product_image"] = copy_rows(cur, "product_image", ["image_id", "image_url", "variant_id"], images())
+
+    # popularity is skewed: low product ids get most reviews and sales, like a real catalog
+    def popular_product():
+        return first_product + int(args.products * rng.random() ** 2)
+
+    def reviews():
+        for i in range(args.reviews):
+            yield (first_review + i, rng.choices((1, 2, 3, 4, 5), (1, 1, 3, 6, 9))[0], "Bench review",
+                   rng.choice(customer_ids), popular_product(), _timestamp(rng, now))
+    counts["review"] = copy_rows(cur, "review", ["review_id", "rating", "comment", "user_id", "product_id", "created_at"], reviews())
+
+    # order lines are drawn with their order so the order row can carry its
+    # total; they are kept in flat arrays (a few bytes per line) for the second COPY
+    line_order, line_variant, line_quantity = array("i"), array("i"), array("b")
+
+    def orders():
+        for i in range(args.orders):
+            total = 0
+            for _ in range(rng.randint(1, args.max_items_per_order)):
+                v = (popular_product() - first_product) * args.variants_per_product + rng.randrange(args.variants_per_product)
+                quantity = rng.randint(1, 3)
+                line_order.append(i)
+                line_variant.append(v)
+                line_quantity.append(quantity)
+                total += variant_prices[v] * quantity
+            customer = rng.choice(customer_ids)
+            yield (first_order + i, total, rng.choice(STATUSES), customer,
+                   first_address + (customer - customer_ids[0]), _timestamp(rng, now))
+    counts["orders"] = copy_rows(cur, "orders", ["order_id", "total_amount", "status", "user_id", "address_id", "created_at"], orders())
+
+    def order_items():
+        for i, v in enumerate(line_variant):
+            yield (line_quantity[i], variant_prices[v], first_order + line_order[i], first_variant + v)
+    counts["order_item"] = copy_rows(cur, "order_item", ["quantity", "price_at_purchase", "order_id", "variant_id"], order_items())
+    return counts
+
+
+def finish(cur):
+    """Recompute what the deferred triggers and the leaderboard would have maintained."""
+    cur.execute("SELECT refresh_product_ratings()")
+    print(f"  rating counters repaired on {cur.fetchone()[0]} products")
+    # image_blob reference counts, same backfill as migrate_perf 5.2 (only
+    # /uploads/ URLs are counted, so placeholder images leave it unchanged)
+    cur.execute("""
+        INSERT INTO image_blob (image_url, ref_count)
+        SELECT image_url, COUNT(*) FROM product_image WHERE image_url LIKE '/uploads/%%' GROUP BY image_url
+        ON CONFLICT (image_url) DO UPDATE SET ref_count = EXCLUDED.ref_count
+    """)
+    cur.execute("""
+        UPDATE image_blob b SET ref_count = 0
+        WHERE ref_count <> 0 AND NOT EXISTS (SELECT 1 FROM product_image pi WHERE pi.image_url = b.image_url)
+    """)
+    cur.execute("SELECT refresh_product_leaderboard()")
+    for table in ("users", "address", "category", "product", "product_variant", "product_image", "review", "orders", "order_item"):
+        cur.execute(f"ANALYZE {table}")
+
+
+def add_size_arguments(parser, **defaults):
+    """Dataset size flags, shared with benchmark.py --seed."""
+    sizes = {"users": 10000, "products": 100000, "reviews": 300000, "orders": 100000, **defaults}
+    parser.add_argument("--users", type=int, default=sizes["users"], help="customers")
+    parser.add_argument("--sellers", type=int, default=0, help="default: one per 20 customers")
+    parser.add_argument("--categories", type=int, default=8, help="top-level categories")
+    parser.add_argument("--subcategories", type=int, default=6, help="children per top-level category")
+    parser.add_argument("--products", type=int, default=sizes["products"])
+    parser.add_argument("--variants-per-product", type=int, default=3)
+    parser.add_argument("--images-per-variant", type=int, default=1)
+    parser.add_argument("--reviews", type=int, default=sizes["reviews"])
+    parser.add_argument("--orders", type=int, default=sizes["orders"])
+    parser.add_argument("--max-items-per-order", type=int, default=4)
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--reseed", action="store_true", help="remove previously generated data first")
+
+
+def remove_generated(cur):
+    # products, reviews, orders and addresses cascade from the users
+    cur.execute("DELETE FROM users WHERE email LIKE %s", (f"%@{BENCH_EMAIL_DOMAIN}",))
+    cur.execute("DELETE FROM category WHERE name LIKE %s", (f"{BENCH_CATEGORY_PREFIX}%",))
+
+
+def load(args):
+    if args.variants_per_product < 1 or args.users < 1 or args.products < 1:
+        sys.exit("--users, --products and --variants-per-product must be at least 1")
+
+    conn = connect()
+    cur = conn.cursor()
+    started = time.perf_counter()
+    try:
+        cur.execute("SET synchronous_commit = off")
+        if args.reseed:
+            remove_generated(cur)
+        cur.execute("SELECT 1 FROM users WHERE email LIKE %s LIMIT 1", (f"%@{BENCH_EMAIL_DOMAIN}",))
+        if cur.fetchone():
+            sys.exit("Generated data already present, pass --reseed to replace it")
+
+        for table, trigger in DEFERRED_TRIGGERS:
+            cur.execute(f"ALTER TABLE {table} DISABLE TRIGGER {trigger}")
+        print("--- Streaming rows with COPY ---")
+        counts = generate(cur, args)
+        for table, trigger in DEFERRED_TRIGGERS:
+            cur.execute(f"ALTER TABLE {table} ENABLE TRIGGER {trigger}")
+        print("--- Rebuilding derived data ---")
+        finish(cur)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"Loaded {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and COPY a synthetic FolkMint dataset")
+    add_size_arguments(parser)
+    load(parser.parse_args())
@@ -0,0 +1,54 @@
+# HTTP conditional request support: ETags for JSON responses and long-lived
+# Cache-Control headers for static files.
+import hashlib
+import json
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.staticfiles import StaticFiles
+
+# Browsers keep the JSON but revalidate with If-None-Match on every use
+API_CACHE_CONTROL = "no-cache"
+# uploads/ files are named by uuid/content, so a URL never changes meaning
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE_CONTROL = "public, max-age=86400"
+
+
+def render_json(payload):
+    """Serialize a payload once and fingerprint it.
+
+    Returns a plain dict so it can be stored in any response cache backend;
+    hits are then answered without serializing the body again.
+    """
+    body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":"))
+    etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+    return {"etag": etag, "body": body}
+
+
+def etag_matches(request: Request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    # weak comparison, as required for If-None-Match
+    return "*" in candidates or etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+
+def json_response(request: Request, rendered):
+    """Answer with 304 when the client already has this body, else send it."""
+    headers = {"ETag": rendered["etag"], "Cache-Control": API_CACHE_CONTROL}
+    if etag_matches(request, rendered["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=rendered["body"], media_type="application/json", headers=headers)
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles already answers ETag/Last-Modified revalidation; this adds Cache-Control."""
+
+    def __init__(self, *args, cache_control=STATIC_CACHE_CONTROL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = self.cache_control
+        return response
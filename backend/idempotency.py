@@ -0,0 +1,68 @@
+# Idempotency-Key support for mutating endpoints (checkout, cart/add, reviews).
+# A route claims the key inside its own transaction before doing the work and
+# stores its response before committing. A retry with the same key gets the
+# stored response back without redoing the work; a retry that arrives while
+# the first attempt is still running blocks on the key's primary key and
+# then replays. Failed attempts roll back their claim, so they can be retried.
+import hashlib
+import json
+import os
+import random
+from psycopg2.extras import Json
+from database import standard_response
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+MAX_KEY_LENGTH = 255
+# share of claims that also purge expired keys
+PURGE_PROBABILITY = 0.01
+
+
+def request_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def claim_key(db, user_id, key, scope, payload):
+    """Claim a key for this request, or return the response stored for it.
+
+    Returns None when the caller should do the work (and later save_response),
+    otherwise the response to send as is.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        return standard_response(False, message="Idempotency-Key is too long")
+    fingerprint = request_hash(payload)
+    with db.cursor() as cur:
+        if random.random() < PURGE_PROBABILITY:
+            cur.execute("DELETE FROM idempotency_key WHERE expires_at < NOW()")
+        # An expired key may be reused as if it were new
+        cur.execute("""
+            INSERT INTO idempotency_key (user_id, idem_key, scope, request_hash, expires_at)
+            VALUES (%s, %s, %s, %s, NOW() + make_interval(hours => %s))
+            ON CONFLICT (user_id, idem_key) DO UPDATE
+            SET scope = EXCLUDED.scope, request_hash = EXCLUDED.request_hash,
+                response = NULL, created_at = NOW(), expires_at = EXCLUDED.expires_at
+            WHERE idempotency_key.expires_at < NOW()
+            RETURNING 1
+        """, (user_id, key, scope, fingerprint, IDEMPOTENCY_TTL_HOURS))
+        if cur.fetchone():
+            return None
+        cur.execute(
+            "SELECT scope, request_hash, response FROM idempotency_key WHERE user_id = %s AND idem_key = %s",
+            (user_id, key)
+        )
+        stored = cur.fetchone()
+    if stored is None or stored[2] is None:
+        # row vanished or was never completed (should not happen, the claim commits with the response)
+        return standard_response(False, message="A request with this Idempotency-Key is still in progress")
+    if stored[0] != scope or stored[1] != fingerprint:
+        return standard_response(False, message="Idempotency-Key was already used for a different request")
+    return stored[2]
+
+
+def save_response(db, user_id, key, response):
+    """Store the response for a claimed key; commit it together with the work."""
+    with db.cursor() as cur:
+        cur.execute(
+            "UPDATE idempotency_key SET response = %s WHERE user_id = %s AND idem_key = %s",
+            (Json(response), user_id, key)
+        )
+    return response
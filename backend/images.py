@@ -0,0 +1,112 @@
+# Image derivative pipeline: resized WebP (and AVIF when Pillow supports it)
+# copies of product images so listings can serve small files instead of the
+# raw originals. Derivatives are written to uploads/derived/ and named after
+# a hash of the source URL and the source bytes: a replaced /images file gets
+# new derivative URLs, so they can be served as immutable like the uploads.
+import hashlib
+import os
+from PIL import Image, ImageOps, features
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+UPLOADS_DIR = os.path.join(PROJECT_ROOT, "uploads")
+IMAGES_DIR = os.path.join(os.path.dirname(PROJECT_ROOT), "gemini_img")
+DERIVED_DIR = os.path.join(UPLOADS_DIR, "derived")
+
+# URL prefix -> directory it is served from (see the static mounts in main.py)
+SOURCE_ROOTS = {"/uploads/": UPLOADS_DIR, "/images/": IMAGES_DIR}
+
+WIDTHS = (200, 400, 800)
+THUMBNAIL_WIDTH = 400
+QUALITY = {"webp": 80, "avif": 60}
+FORMATS = ("webp", "avif") if features.check("avif") else ("webp",)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".jfif", ".avif")
+
+
+def source_path(image_url):
+    """Filesystem path behind a local image URL, or None for external URLs."""
+    for prefix, root in SOURCE_ROOTS.items():
+        if image_url.startswith(prefix):
+            path = os.path.normpath(os.path.join(root, image_url[len(prefix):]))
+            # never follow ../ out of the served directory
+            if path.startswith(root + os.sep):
+                return path
+    return None
+
+
+def _source_digest(image_url, path):
+    # the URL is part of the key so two sources never share (and gc) derivatives
+    digest = hashlib.sha1(image_url.encode() + b"\0")
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:20]
+
+
+def _local_digest(image_url):
+    """Digest of a local image, or None for external URLs and missing files."""
+    path = source_path(image_url)
+    if not path or not os.path.isfile(path):
+        return None
+    return _source_digest(image_url, path)
+
+
+def _derived_name(digest, width, fmt):
+    return f"{digest}_w{width}.{fmt}"
+
+
+def _describe(digest):
+    derivatives = {
+        fmt: {str(w): f"/uploads/derived/{_derived_name(digest, w, fmt)}" for w in WIDTHS}
+        for fmt in FORMATS
+    }
+    return {"thumbnail_url": derivatives["webp"][str(THUMBNAIL_WIDTH)], "derivatives": derivatives}
+
+
+def derivative_paths(image_url):
+    """Every derivative file that generate_derivatives() may write for the image as it is now."""
+    digest = _local_digest(image_url)
+    if not digest:
+        return []
+    return [os.path.join(DERIVED_DIR, _derived_name(digest, w, fmt)) for w in WIDTHS for fmt in FORMATS]
+
+
+def existing_derivatives(image_url):
+    """Derivative URLs for an image if they have already been generated."""
+    digest = _local_digest(image_url)
+    if not digest:
+        return None
+    thumb = os.path.join(DERIVED_DIR, _derived_name(digest, THUMBNAIL_WIDTH, "webp"))
+    return _describe(digest) if os.path.exists(thumb) else None
+
+
+def generate_derivatives(image_url):
+    """Write every size/format of an image, skipping files that already exist.
+
+    Returns the same description as existing_derivatives(), or None when the
+    URL does not point at a local image. Blocking; call it off the event loop.
+    """
+    path = source_path(image_url)
+    if not path or not os.path.isfile(path):
+        return None
+    digest = _source_digest(image_url, path)
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+
+    with Image.open(path) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            original = original.convert("RGBA" if "transparency" in original.info else "RGB")
+        for width in WIDTHS:
+            resized = None
+            for fmt in FORMATS:
+                target = os.path.join(DERIVED_DIR, _derived_name(digest, width, fmt))
+                if os.path.exists(target):
+                    continue
+                if resized is None:
+                    # never upscale, small originals are just re-encoded
+                    resized = original.copy()
+                    resized.thumbnail((width, width * 4), Image.LANCZOS)
+                # write then rename so a half-written file is never served
+                tmp = target + ".tmp"
+                resized.save(tmp, format=fmt.upper(), quality=QUALITY[fmt])
+                os.replace(tmp, target)
+    return _describe(digest)
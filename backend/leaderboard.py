@@ -0,0 +1,69 @@
+# Keeps the product_leaderboard materialized view (migrate_perf) fresh.
+# A daemon thread per worker refreshes it on an interval; an advisory lock
+# makes sure only one worker actually runs the refresh at a time.
+import os
+import threading
+import time
+
+REFRESH_SECONDS = int(os.getenv("LEADERBOARD_REFRESH_SECONDS", "300"))
+REFRESH_LOCK_KEY = 730101
+
+TOP_RATED_QUERY = """
+    SELECT
+        p.product_id,
+        p.name,
+        p.base_price AS price,
+        p.category_id AS category,
+        lb.average_rating AS "averageRating",
+        lb.review_count AS "totalReviews",
+        lb.units_sold AS "totalSales",
+        COALESCE(img.images, '{}') AS images,
+        img.thumbnails[1] AS main_image_thumb
+    FROM product_leaderboard lb
+    JOIN product p ON p.product_id = lb.product_id
+    LEFT JOIN LATERAL (
+        SELECT array_agg(u.image_url ORDER BY u.variant_id, u.image_id) AS images,
+               array_agg(COALESCE(u.thumbnail_url, u.image_url) ORDER BY u.variant_id, u.image_id) AS thumbnails
+        FROM (
+            SELECT DISTINCT ON (pi.image_url) pi.image_url, pi.thumbnail_url, pv.variant_id, pi.image_id
+            FROM product_image pi
+            JOIN product_variant pv ON pi.variant_id = pv.variant_id
+            WHERE pv.product_id = p.product_id
+            ORDER BY pi.image_url, pv.variant_id, pi.image_id
+        ) u
+    ) img ON TRUE
+    ORDER BY lb.average_rating DESC, lb.units_sold DESC, lb.review_count DESC
+    LIMIT %s
+"""
+
+
+def refresh_leaderboard(conn):
+    """Refresh the view unless another worker is already doing it."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+        if cur.fetchone()[0]:
+            cur.execute("SELECT refresh_product_leaderboard()")
+    conn.commit()
+
+
+def start_leaderboard_refresher(pool):
+    if REFRESH_SECONDS <= 0:
+        return
+
+    def loop():
+        while True:
+            time.sleep(REFRESH_SECONDS)
+            try:
+                conn = pool.getconn()
+            except Exception as e:
+                print(f"Error refreshing leaderboard: {e}")
+                continue
+            try:
+                refresh_leaderboard(conn)
+            except Exception as e:
+                conn.rollback()
+                print(f"Error refreshing leaderboard: {e}")
+            finally:
+                pool.putconn(conn)
+
+    threading.Thread(target=loop, name="leaderboard-refresh", daemon=True).start()
@@ -1,16 +1,27 @@
 import os
 import psycopg2
 from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from database import connection_pool, get_db, standard_response
+from db_pool import db_pool, get_db as get_managed_db
+from async_database import async_pool, open_async_pool, close_async_pool
 from auth_utils import get_current_user
+from suggest import load_suggestions, start_suggestion_refresher
+from leaderboard import start_leaderboard_refresher
+from cache import response_cache
+import metrics
+import sql_trace
+from http_cache import CachedStaticFiles, IMMUTABLE_CACHE_CONTROL
 
 # Import Routers
 from routers import auth, products, orders, cart, seller, admin, newsletter, upload, wishlist, analytics
 
 app = FastAPI(title="FolkMint API")
 
+# Cap upload bodies while they stream in; added first so CORS headers wrap its 413s
+app.add_middleware(upload.UploadLimitMiddleware)
+
 # Enable CORS
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://localhost:5174,http://127.0.0.1:5173,http://127.0.0.1:5174").split(",")
 app.add_middleware(
@@ -19,8 +30,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Query-Count"],
 )
 
+# Debug SQL trace headers; registered first so it runs inside the metrics middleware
+if sql_trace.SQL_TRACE:
+    app.middleware("http")(sql_trace.sql_trace_middleware)
+
+# Per-route latency, status codes and SQL counts for /metrics
+app.middleware("http")(metrics.metrics_middleware)
+
 # Directories
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 UPLOADS_DIR = os.path.join(PROJECT_ROOT, "uploads")
@@ -30,28 +49,57 @@ os.makedirs(UPLOADS_DIR, exist_ok=True)
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
 # Mount Static Files
-app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads")
-app.mount("/images", StaticFiles(directory=IMAGES_DIR), name="images")
+# uploads/ file names are never reused, so browsers may keep them forever
+app.mount("/uploads", CachedStaticFiles(directory=UPLOADS_DIR, cache_control=IMMUTABLE_CACHE_CONTROL), name="uploads")
+app.mount("/images", CachedStaticFiles(directory=IMAGES_DIR), name="images")
 
 # Startup Logic
 @app.on_event("startup")
 def startup_db_init():
+    # database.py's pool is superseded by the managed one, release its connections
     if connection_pool:
+        connection_pool.closeall()
+    try:
+        db_pool.open()
+        conn = db_pool.getconn()
         try:
-            with connection_pool.getconn() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        CREATE TABLE IF NOT EXISTS newsletter_subscriptions (
-                            id SERIAL PRIMARY KEY,
-                            email VARCHAR(255) UNIQUE NOT NULL,
-                            subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """)
-                    conn.commit()
-                connection_pool.putconn(conn)
-            print("Database initialized successfully")
-        except Exception as e:
-            print(f"Error initializing database: {e}")
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS newsletter_subscriptions (
+                        id SERIAL PRIMARY KEY,
+                        email VARCHAR(255) UNIQUE NOT NULL,
+                        subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                conn.commit()
+                # Typeahead index lives in memory, fill it once per worker
+                load_suggestions(cur)
+        finally:
+            db_pool.putconn(conn)
+        start_leaderboard_refresher(db_pool)
+        start_suggestion_refresher(db_pool)
+        print("Database initialized successfully")
+    except Exception as e:
+        print(f"Error initializing database: {e}")
+
+@app.on_event("shutdown")
+def shutdown_db_pool():
+    db_pool.close()
+
+# Async pool for the read routes (see async_database.py)
+@app.on_event("startup")
+async def startup_async_pool():
+    try:
+        await open_async_pool()
+    except Exception as e:
+        print(f"Error opening async database pool: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_async_pool():
+    await close_async_pool()
+
+# Every Depends(get_db) in the routers checks out from the managed pool
+app.dependency_overrides[get_db] = get_managed_db
 
 # Include Routers
 app.include_router(auth.router)
@@ -72,7 +120,21 @@ def get_me(current_user: dict = Depends(get_current_user)):
 
 @app.get("/api/health")
 def health_check():
-    return standard_response(True, message="Service is healthy")
+    data = {
+        "cache": response_cache.stats(),
+        "db_pool": db_pool.stats(),
+        "async_db_pool": async_pool.get_stats(),
+    }
+    return standard_response(True, data=data, message="Service is healthy")
+
+db_pool_connections = metrics.Gauge("db_pool_connections", "Managed pool connections by state.", ("state",))
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    stats = db_pool.stats()
+    db_pool_connections.set("in_use", value=stats["in_use"])
+    db_pool_connections.set("idle", value=stats["idle"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
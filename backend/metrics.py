@@ -0,0 +1,156 @@
+# Prometheus text-format metrics for /metrics, no client library needed.
+# The HTTP middleware records latency, status and in-flight requests per
+# route template (/api/products/{product_id}, not the raw path), and the
+# instrumented cursors in db_pool.py / async_database.py report every
+# statement to record_query() (via sql_trace.observe) so each request knows
+# its SQL count and DB time. A route whose query count jumps is an N+1
+# regression.
+import threading
+import time
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                i = len(self.buckets)
+            counts[i] += 1
+            self._values[labels] = (counts, total + value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels + ('le',), key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+http_requests_total = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "Requests currently being served.")
+db_queries_total = Counter("db_queries_total", "SQL statements executed, by route.", ("route",))
+db_queries_per_request = Histogram("db_queries_per_request", "SQL statements per request.", ("route",), QUERY_COUNT_BUCKETS)
+db_time_per_request = Histogram("db_time_per_request_seconds", "Time spent in SQL per request.", ("route",))
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.header())
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    """SQL executed while serving one request."""
+
+    def __init__(self, path=""):
+        self.path = path
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = []  # (statement, params fingerprint, ms), only with SQL_TRACE
+
+
+# Set by the middleware; threadpool routes see it too since Starlette copies the context
+current_request = ContextVar("current_request", default=None)
+
+
+def record_query(statement, params, elapsed):
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+
+
+def route_label(request):
+    # Template path keeps the label set bounded; unknown paths share one label
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+async def metrics_middleware(request, call_next):
+    stats = RequestStats(request.url.path)
+    token = current_request.set(stats)
+    http_in_flight.inc(amount=1)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        http_in_flight.inc(amount=-1)
+        current_request.reset(token)
+        route = route_label(request)
+        http_requests_total.inc(request.method, route, str(status))
+        http_request_duration.observe(request.method, route, value=elapsed)
+        db_queries_total.inc(route, amount=stats.queries)
+        db_queries_per_request.observe(route, value=stats.queries)
+        db_time_per_request.observe(route, value=stats.db_time)
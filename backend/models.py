@@ -69,6 +69,10 @@ class CartItemAdd(BaseModel):
     variant_id: int
     quantity: int
 
+class CartSync(BaseModel):
+    items: List[CartItemAdd]
+    replace: bool = False # False adds to the saved quantities, True makes the cart exactly `items`
+
 class PaymentMethodCreate(BaseModel):
     card_last4: str
     type: str
@@ -10,7 +10,9 @@ conn = psycopg2.connect(
 )
 cur = conn.cursor()
 
-base_dir = r"c:\Users\HP\OneDrive\Desktop\FolkMint Stuff\FolkMint project\gemini_img\catagorized img"
+# Categorized product photos shipped in the repo (served under /images/)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+base_dir = os.getenv("CATALOG_IMAGES_DIR", os.path.join(PROJECT_ROOT, "gemini_img", "catagorized img"))
 
 # Make sure we have a seller
 cur.execute("SELECT user_id FROM users WHERE role='seller' LIMIT 1")
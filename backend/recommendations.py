@@ -0,0 +1,44 @@
+# Lookups for the precomputed recommendation tables (migrate_perf section 10,
+# filled by build_recommendations.py). Each one is a single primary-key range
+# scan with the card image joined in, so the endpoints run one query.
+
+RECOMMENDATION_COLUMNS = """
+        p.product_id,
+        p.name,
+        p.base_price,
+        p.rating_sum,
+        p.rating_count,
+        img.image_url AS main_image,
+        COALESCE(img.thumbnail_url, img.image_url) AS main_image_thumb
+"""
+
+MAIN_IMAGE_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT pi.image_url, pi.thumbnail_url
+        FROM product_image pi
+        JOIN product_variant pv ON pi.variant_id = pv.variant_id
+        WHERE pv.product_id = p.product_id
+        ORDER BY pv.variant_id, pi.image_id
+        LIMIT 1
+    ) img ON TRUE
+"""
+
+USER_RECOMMENDATIONS_QUERY = f"""
+    SELECT {RECOMMENDATION_COLUMNS}
+    FROM user_recommendation r
+    JOIN product p ON p.product_id = r.product_id
+    {MAIN_IMAGE_JOIN}
+    WHERE r.user_id = %s
+    ORDER BY r.rank
+    LIMIT %s
+"""
+
+PRODUCT_RECOMMENDATIONS_QUERY = f"""
+    SELECT {RECOMMENDATION_COLUMNS}
+    FROM product_recommendation r
+    JOIN product p ON p.product_id = r.recommended_id
+    {MAIN_IMAGE_JOIN}
+    WHERE r.product_id = %s
+    ORDER BY r.rank
+    LIMIT %s
+"""
@@ -0,0 +1,18 @@
+import psycopg2, os
+from dotenv import load_dotenv
+
+# Recomputes product.rating_sum/rating_count from the review table.
+# Run once after applying migrate_perf, or whenever the counters look off.
+load_dotenv('.env')
+conn = psycopg2.connect(
+    host=os.getenv('DB_HOST'), database=os.getenv('DB_NAME'),
+    user=os.getenv('DB_USER'), password=os.getenv('DB_PASSWORD'), port=os.getenv('DB_PORT')
+)
+cur = conn.cursor()
+try:
+    cur.execute("SELECT refresh_product_ratings()")
+    fixed = cur.fetchone()[0]
+    conn.commit()
+    print(f"Rating counters repaired on {fixed} products.")
+except Exception as e:
+    print(e)
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends
 from psycopg2.extras import RealDictCursor
 from database import get_db, standard_response
 from models import OrderStatusUpdate
+from suggest import suggest_index
+from cache import response_cache
 from auth_utils import role_required
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
@@ -74,6 +76,8 @@ def admin_delete_product(product_id: int, current_user: dict = Depends(role_requ
     try:
         cursor.execute("DELETE FROM product WHERE product_id=%s", (product_id,))
         db.commit()
+        suggest_index.remove("product", product_id)
+        response_cache.invalidate("products", f"product:{product_id}")
         return standard_response(True, message="Product deleted successfully")
     except Exception as e:
         db.rollback()
@@ -1,73 +1,236 @@
-from fastapi import APIRouter, Depends
+import json
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header
 from psycopg2.extras import RealDictCursor
 from database import get_db, standard_response
-from models import CartItemAdd
+from async_database import get_async_db
+from models import CartItemAdd, CartSync
 from auth_utils import get_current_user
+from idempotency import claim_key, save_response
 
 router = APIRouter(prefix="/api/cart", tags=["cart"])
 
+# How long items in a cart hold their stock (see reserve_stock in migrate_perf)
+RESERVATION_MINUTES = int(os.getenv("CART_RESERVATION_MINUTES", "15"))
+
+
+# Shared tail of the cart writes: hold stock for the row's new quantity.
+# reserve_stock does not read cart_item, so it can run in the same statement.
+RESERVE_COLUMNS = "reserve_stock(%(user_id)s, variant_id, quantity, make_interval(mins => %(minutes)s)) AS available"
+
+# Upsert the cart and the line in one statement. The variant is locked first,
+# in the same order checkout and reserve_stock take it, and an unknown
+# variant inserts nothing (no row back).
+ADD_ITEM_QUERY = f"""
+    WITH v AS (
+        SELECT variant_id, product_id FROM product_variant WHERE variant_id = %(variant_id)s FOR UPDATE
+    ), c AS (
+        INSERT INTO cart (user_id) SELECT %(user_id)s FROM v
+        ON CONFLICT (user_id) DO UPDATE SET updated_at = NOW()
+        RETURNING cart_id
+    ), line AS (
+        INSERT INTO cart_item (quantity, cart_id, variant_id, product_id)
+        SELECT %(quantity)s, c.cart_id, v.variant_id, v.product_id FROM c, v
+        ON CONFLICT (cart_id, variant_id)
+        DO UPDATE SET quantity = cart_item.quantity + EXCLUDED.quantity, updated_at = NOW()
+        RETURNING variant_id, quantity
+    )
+    SELECT variant_id, quantity, {RESERVE_COLUMNS} FROM line
+"""
+
+UPDATE_ITEM_QUERY = f"""
+    WITH v AS (
+        SELECT pv.variant_id FROM cart_item ci
+        JOIN cart c ON c.cart_id = ci.cart_id
+        JOIN product_variant pv ON pv.variant_id = ci.variant_id
+        WHERE ci.cart_item_id = %(item_id)s AND c.user_id = %(user_id)s
+        FOR UPDATE OF pv
+    ), line AS (
+        UPDATE cart_item ci SET quantity = %(quantity)s, updated_at = NOW()
+        FROM cart c, v
+        WHERE ci.cart_item_id = %(item_id)s AND c.cart_id = ci.cart_id AND c.user_id = %(user_id)s
+        RETURNING ci.variant_id, ci.quantity
+    )
+    SELECT variant_id, quantity, {RESERVE_COLUMNS} FROM line
+"""
+
+# quantity 0 releases the hold. The variant is locked first, like the other
+# cart writes, so the delete and reserve_stock take locks in the same order.
+REMOVE_ITEM_QUERY = f"""
+    WITH v AS (
+        SELECT pv.variant_id FROM cart_item ci
+        JOIN cart c ON c.cart_id = ci.cart_id
+        JOIN product_variant pv ON pv.variant_id = ci.variant_id
+        WHERE ci.cart_item_id = %(item_id)s AND c.user_id = %(user_id)s
+        FOR UPDATE OF pv
+    ), line AS (
+        DELETE FROM cart_item ci USING cart c, v
+        WHERE ci.cart_item_id = %(item_id)s AND c.cart_id = ci.cart_id AND c.user_id = %(user_id)s
+        RETURNING ci.variant_id, 0 AS quantity
+    )
+    SELECT variant_id, quantity, {RESERVE_COLUMNS} FROM line
+"""
+
+# Whole-cart write for PUT /api/cart, duplicates in the input are summed.
+# Every variant the statement touches (incoming, and with replace the lines
+# it deletes) is locked up front in one id-ordered pass, the order checkout
+# and reserve_stock use, so concurrent syncs cannot deadlock. The aggregate
+# makes the lock pass run to completion before the writes read its result.
+# With replace, lines missing from the input are deleted and their holds released.
+SYNC_CART_QUERY = f"""
+    WITH input AS (
+        SELECT (e->>'variant_id')::int AS variant_id, SUM((e->>'quantity')::int) AS quantity
+        FROM jsonb_array_elements(%(items)s::jsonb) e
+        GROUP BY 1 HAVING SUM((e->>'quantity')::int) > 0
+    ), locked AS (
+        SELECT array_agg(variant_id) AS ids FROM (
+            SELECT pv.variant_id FROM product_variant pv
+            WHERE pv.variant_id IN (SELECT variant_id FROM input)
+               OR pv.variant_id IN (
+                   SELECT ci.variant_id FROM cart_item ci JOIN cart ON cart.cart_id = ci.cart_id
+                   WHERE %(replace)s AND cart.user_id = %(user_id)s
+               )
+            ORDER BY pv.variant_id
+            FOR UPDATE
+        ) ordered
+    ), v AS (
+        SELECT pv.variant_id, pv.product_id, input.quantity
+        FROM input JOIN product_variant pv ON pv.variant_id = input.variant_id
+        WHERE pv.variant_id = ANY((SELECT ids FROM locked))
+    ), c AS (
+        INSERT INTO cart (user_id) VALUES (%(user_id)s)
+        ON CONFLICT (user_id) DO UPDATE SET updated_at = NOW()
+        RETURNING cart_id
+    ), removed AS (
+        DELETE FROM cart_item ci USING c
+        WHERE %(replace)s AND ci.cart_id = c.cart_id
+          AND ci.variant_id = ANY((SELECT ids FROM locked))
+          AND ci.variant_id NOT IN (SELECT variant_id FROM v)
+        RETURNING ci.variant_id, 0 AS quantity
+    ), line AS (
+        INSERT INTO cart_item (quantity, cart_id, variant_id, product_id)
+        SELECT v.quantity, c.cart_id, v.variant_id, v.product_id FROM v, c
+        ON CONFLICT (cart_id, variant_id) DO UPDATE
+        SET quantity = CASE WHEN %(replace)s THEN EXCLUDED.quantity ELSE cart_item.quantity + EXCLUDED.quantity END,
+            updated_at = NOW()
+        RETURNING variant_id, quantity
+    )
+    SELECT variant_id, quantity, {RESERVE_COLUMNS} FROM line
+    UNION ALL
+    SELECT variant_id, quantity, {RESERVE_COLUMNS} FROM removed
+"""
+
+CART_ITEMS_QUERY = """
+    SELECT
+        ci.cart_item_id, ci.quantity, ci.variant_id, p.name,
+        pv.price, pv.color, pv.size, p.product_id,
+        (SELECT image_url FROM product_image WHERE variant_id = pv.variant_id LIMIT 1) as image
+    FROM cart c
+    JOIN cart_item ci ON ci.cart_id = c.cart_id
+    JOIN product_variant pv ON ci.variant_id = pv.variant_id
+    JOIN product p ON pv.product_id = p.product_id
+    WHERE c.user_id = %s
+"""
+
+
+def bad_quantity():
+    # every cart write rejects it the same way; removing a line is DELETE /item/{id}
+    return standard_response(False, message="Quantity must be at least 1")
+
+
+def out_of_stock(variant_id, requested, available):
+    return standard_response(
+        False,
+        data={"variant_id": variant_id, "requested": requested, "available": max(available, 0)},
+        message=f"Only {max(available, 0)} left in stock"
+    )
+
 @router.get("")
-def get_cart(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+async def get_cart(current_user: dict = Depends(get_current_user), db=Depends(get_async_db)):
     user_id = current_user["user_id"]
-    cursor = db.cursor(cursor_factory=RealDictCursor)
+    cursor = db.cursor()
     try:
-        cursor.execute("SELECT cart_id FROM cart WHERE user_id = %s", (user_id,))
-        cart = cursor.fetchone()
-        if not cart: return standard_response(True, data={"items": []})
-        
-        cursor.execute(
-            """
-            SELECT 
-                ci.cart_item_id, ci.quantity, ci.variant_id, p.name, 
-                pv.price, pv.color, pv.size, p.product_id,
-                (SELECT image_url FROM product_image WHERE variant_id = pv.variant_id LIMIT 1) as image
-            FROM cart_item ci 
-            JOIN product_variant pv ON ci.variant_id = pv.variant_id 
-            JOIN product p ON pv.product_id = p.product_id 
-            WHERE ci.cart_id = %s
-            """,
-            (cart["cart_id"],)
-        )
-        items = cursor.fetchall()
+        await cursor.execute(CART_ITEMS_QUERY, (user_id,))
+        items = await cursor.fetchall()
         for i in items:
             i["price"] = float(i["price"])
         return standard_response(True, data={"items": items})
     except Exception as e:
         return standard_response(False, message=f"Failed to fetch cart: {str(e)}")
+    finally:
+        await cursor.close()
+
+@router.put("")
+def sync_cart(cart: CartSync, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+    """Apply a whole cart in one transaction (e.g. the guest cart at login) and return it."""
+    if any(i.quantity < 1 for i in cart.items):
+        return bad_quantity()
+    user_id = current_user["user_id"]
+    cursor = db.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor.execute(SYNC_CART_QUERY, {
+            "user_id": user_id, "items": json.dumps([i.dict() for i in cart.items]),
+            "replace": cart.replace, "minutes": RESERVATION_MINUTES,
+        })
+        lines = cursor.fetchall()
+        short = [
+            {"variant_id": l["variant_id"], "requested": l["quantity"], "available": max(l["available"], 0)}
+            # removed lines come back with quantity 0 and can never be short
+            for l in lines if l["quantity"] > 0 and l["available"] < l["quantity"]
+        ]
+        if short:
+            db.rollback()
+            return standard_response(False, data={"unavailable": short}, message="Some items are no longer available in the requested quantity")
+
+        # variants that no longer exist are skipped, the caller is told which
+        kept = {l["variant_id"] for l in lines if l["quantity"] > 0}
+        rejected = sorted({i.variant_id for i in cart.items} - kept)
+
+        cursor.execute(CART_ITEMS_QUERY, (user_id,))
+        items = cursor.fetchall()
+        db.commit()
+        for i in items:
+            i["price"] = float(i["price"])
+        return standard_response(True, data={"items": items, "rejected": rejected})
+    except Exception as err:
+        db.rollback()
+        return standard_response(False, message=f"Failed to update cart: {str(err)}")
     finally:
         cursor.close()
 
 @router.post("/add")
-def add_to_cart(item: CartItemAdd, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def add_to_cart(item: CartItemAdd, current_user: dict = Depends(get_current_user), db=Depends(get_db),
+                idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    if item.quantity < 1:
+        return bad_quantity()
     user_id = current_user["user_id"]
     cursor = db.cursor(cursor_factory=RealDictCursor)
     try:
-        cursor.execute("SELECT cart_id FROM cart WHERE user_id = %s", (user_id,))
-        cart = cursor.fetchone()
-        if not cart:
-            cursor.execute("INSERT INTO cart (user_id) VALUES (%s) RETURNING cart_id", (user_id,))
-            cart_id = cursor.fetchone()["cart_id"]
-        else:
-            cart_id = cart["cart_id"]
-        
-        cursor.execute("SELECT cart_item_id, quantity FROM cart_item WHERE cart_id = %s AND variant_id = %s", (cart_id, item.variant_id))
-        existing = cursor.fetchone()
-        
-        if existing:
-            cursor.execute("UPDATE cart_item SET quantity = %s WHERE cart_item_id = %s", (existing["quantity"] + item.quantity, existing["cart_item_id"]))
-        else:
-            # Need to get product_id from variant_id
-            cursor.execute("SELECT product_id FROM product_variant WHERE variant_id = %s", (item.variant_id,))
-            res = cursor.fetchone()
-            if not res:
-                return standard_response(False, message="Product variant not found")
-            product_id = res["product_id"]
-            
-            cursor.execute("INSERT INTO cart_item (quantity, cart_id, variant_id, product_id) VALUES (%s, %s, %s, %s)", 
-                           (item.quantity, cart_id, item.variant_id, product_id))
-        
+        # A retried add must not bump the quantity a second time
+        if idempotency_key:
+            replay = claim_key(db, user_id, idempotency_key, "cart_add", item.dict())
+            if replay is not None:
+                db.rollback()
+                return replay
+
+        cursor.execute(ADD_ITEM_QUERY, {
+            "user_id": user_id, "variant_id": item.variant_id, "quantity": item.quantity,
+            "minutes": RESERVATION_MINUTES,
+        })
+        line = cursor.fetchone()
+        if not line:
+            db.rollback()
+            return standard_response(False, message="Product variant not found")
+        if line["available"] < line["quantity"]:
+            db.rollback()
+            return out_of_stock(item.variant_id, line["quantity"], line["available"])
+
+        response = standard_response(True, message="Item added to cart")
+        if idempotency_key:
+            save_response(db, user_id, idempotency_key, response)
         db.commit()
-        return standard_response(True, message="Item added to cart")
+        return response
     except Exception as err:
         db.rollback()
         return standard_response(False, message=f"Failed to add to cart: {str(err)}")
@@ -76,16 +239,21 @@ def add_to_cart(item: CartItemAdd, current_user: dict = Depends(get_current_user
 
 @router.put("/item/{item_id}")
 def update_cart_item(item_id: int, quantity: int, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+    if quantity < 1:
+        return bad_quantity()
     user_id = current_user["user_id"]
-    cursor = db.cursor()
+    cursor = db.cursor(cursor_factory=RealDictCursor)
     try:
-        # Verify ownership
-        cursor.execute("SELECT cart_id FROM cart WHERE user_id = %s", (user_id,))
-        cart = cursor.fetchone()
-        if not cart:
-            return standard_response(False, message="Cart not found")
-            
-        cursor.execute("UPDATE cart_item SET quantity = %s WHERE cart_item_id = %s AND cart_id = %s", (quantity, item_id, cart[0]))
+        cursor.execute(UPDATE_ITEM_QUERY, {
+            "user_id": user_id, "item_id": item_id, "quantity": quantity, "minutes": RESERVATION_MINUTES,
+        })
+        line = cursor.fetchone()
+        if not line:
+            db.rollback()
+            return standard_response(False, message="Cart item not found")
+        if line["available"] < quantity:
+            db.rollback()
+            return out_of_stock(line["variant_id"], quantity, line["available"])
         db.commit()
         return standard_response(True, message="Quantity updated")
     except Exception as e:
@@ -99,13 +267,7 @@ def remove_from_cart(item_id: int, current_user: dict = Depends(get_current_user
     user_id = current_user["user_id"]
     cursor = db.cursor()
     try:
-        # Verify ownership
-        cursor.execute("SELECT cart_id FROM cart WHERE user_id = %s", (user_id,))
-        cart = cursor.fetchone()
-        if not cart:
-            return standard_response(False, message="Cart not found")
-            
-        cursor.execute("DELETE FROM cart_item WHERE cart_item_id = %s AND cart_id = %s", (item_id, cart[0]))
+        cursor.execute(REMOVE_ITEM_QUERY, {"user_id": user_id, "item_id": item_id, "minutes": RESERVATION_MINUTES})
         db.commit()
         return standard_response(True, message="Item removed from cart")
     except Exception as e:
@@ -1,12 +1,34 @@
-from fastapi import APIRouter, Depends
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, Header
+import psycopg2
 from psycopg2.extras import RealDictCursor
 from database import get_db, standard_response
 from models import AddressUpdate, CheckoutRequest
 from pydantic import BaseModel
 from auth_utils import get_current_user
+from idempotency import claim_key, save_response
+from cache import response_cache
 
 router = APIRouter(prefix="/api", tags=["orders"])
 
+# SQLSTATE raised by place_complete_order when stock runs short
+OUT_OF_STOCK = "FM409"
+
+
+def invalidate_stock(db, items):
+    """Drop cached product pages whose variant stock the order just changed."""
+    # runs after the commit: a failure here must not turn a placed order into an error
+    try:
+        variant_ids = [i.get("variant_id") for i in items]
+        with db.cursor() as cur:
+            cur.execute("SELECT DISTINCT product_id FROM product_variant WHERE variant_id = ANY(%s)", (variant_ids,))
+            tags = [f"product:{row[0]}" for row in cur.fetchall()]
+        if tags:
+            response_cache.invalidate(*tags)
+    except Exception as e:
+        print(f"Error invalidating product cache after checkout: {e}")
+
 @router.get("/user/profile")
 def get_user_profile(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
     user_id = current_user["user_id"]
@@ -106,42 +128,46 @@ def update_profile_picture(data: ProfilePictureUpdate, current_user: dict = Depe
         cursor.close()
 
 @router.post("/checkout")
-def checkout(request: CheckoutRequest, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def checkout(request: CheckoutRequest, current_user: dict = Depends(get_current_user), db=Depends(get_db),
+             idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     user_id = current_user["user_id"]
     cursor = db.cursor(cursor_factory=RealDictCursor)
     try:
-        # Handling address (if missing, grab their default address)
-        address_id = request.address_id
-        if not address_id:
-            cursor.execute("SELECT address_id FROM address WHERE user_id = %s LIMIT 1", (user_id,))
-            addr = cursor.fetchone()
-            if addr: address_id = addr["address_id"]
-
-        if not address_id:
-            # Create a default dummy address if none exists
-            cursor.execute(
-                "INSERT INTO address (street, city, postal_code, country, user_id) VALUES (%s, %s, %s, %s, %s) RETURNING address_id",
-                ("123 Main St", "Dhaka", "1000", "Bangladesh", user_id)
-            )
-            address_id = cursor.fetchone()["address_id"]
-
-        # Call the Stored Procedure for the multi-step checkout workflow
-        # Requirement #6 Fulfillment: Stored Procedure handles order + stock + cart
-        import json
-        items_json = json.dumps(request.items)
-        
-        # We call the procedure. It manages the transaction internally if we want, 
-        # but psql/psycopg2 manages the outer transaction block.
-        cursor.execute("CALL place_complete_order(%s, %s, %s::jsonb)", (user_id, address_id, items_json))
-        
-        # Get the order_id from the latest order created by this user
-        cursor.execute("SELECT order_id FROM orders WHERE user_id = %s ORDER BY created_at DESC LIMIT 1", (user_id,))
-        order_id = cursor.fetchone()["order_id"]
-
+        if idempotency_key:
+            # The key is claimed in the order's transaction: a retry replays the
+            # stored response, and a failed attempt releases the key on rollback.
+            replay = claim_key(db, user_id, idempotency_key, "checkout", request.dict())
+            if replay is not None:
+                db.rollback()
+                return replay
+        # The procedure resolves the default address when none is given and
+        # returns the new order id (INOUT p_order_id)
+        cursor.execute(
+            "CALL place_complete_order(%s, %s, %s::jsonb, NULL)",
+            (user_id, request.address_id, json.dumps(request.items))
+        )
+        response = standard_response(True, data={"order_id": cursor.fetchone()["p_order_id"]}, message="Order placed successfully via Stored Procedure")
+        if idempotency_key:
+            save_response(db, user_id, idempotency_key, response)
         db.commit()
-        return standard_response(True, data={"order_id": order_id}, message="Order placed successfully via Stored Procedure")
+        invalidate_stock(db, request.items)
+        return response
+    except psycopg2.Error as err:
+        # a connection lost mid-CALL is closed; the pool discards it as is
+        if not db.closed:
+            db.rollback()
+        if err.pgcode == OUT_OF_STOCK:
+            # place_complete_order lists every short item in DETAIL
+            detail = err.diag.message_detail
+            return standard_response(
+                False,
+                data={"unavailable": json.loads(detail) if detail else []},
+                message="Some items are no longer available in the requested quantity"
+            )
+        return standard_response(False, message=f"Checkout failed: {str(err)}")
     except Exception as err:
-        db.rollback()
+        if not db.closed:
+            db.rollback()
         return standard_response(False, message=f"Checkout failed: {str(err)}")
     finally:
         cursor.close()
@@ -1,244 +1,254 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Query, Request
 from psycopg2.extras import RealDictCursor
 from database import get_db, standard_response
+from async_database import get_async_db
 from models import ReviewCreate
+from catalog import hydrate_products_async, hydrate_fields_async, parse_fields, select_columns, page_limit, decode_cursor, paginate
+from search import RANKED_SEARCH_QUERY, FUZZY_SEARCH_QUERY, FUZZY_MAX_RESULTS, build_tsquery
+from suggest import suggest_index
+from leaderboard import TOP_RATED_QUERY
+from recommendations import USER_RECOMMENDATIONS_QUERY, PRODUCT_RECOMMENDATIONS_QUERY
+from cache import response_cache
+from http_cache import render_json, json_response
 from auth_utils import get_current_user
+from idempotency import claim_key, save_response
 
 router = APIRouter(prefix="/api", tags=["products"])
 
 @router.get("/categories")
-def get_categories(db=Depends(get_db)):
-    cursor = db.cursor(cursor_factory=RealDictCursor)
+async def get_categories(request: Request, db=Depends(get_async_db)):
+    cache_key = response_cache.key("categories")
+    cached = await response_cache.get_async(cache_key)
+    if cached is not None:
+        return json_response(request, cached)
+    cursor = db.cursor()
     try:
-        cursor.execute("SELECT category_id, name, parent_category FROM category")
-        categories = cursor.fetchall()
-        return standard_response(True, data=categories)
+        await cursor.execute("SELECT category_id, name, parent_category FROM category")
+        categories = await cursor.fetchall()
+        response = standard_response(True, data=categories)
+        rendered = render_json(response)
+        await response_cache.set_async(cache_key, rendered, tags=["categories"])
+        return json_response(request, rendered)
     except Exception as e:
         return standard_response(False, message=str(e))
     finally:
-        cursor.close()
+        await cursor.close()
 
 @router.get("/products")
-def get_products(category_id: int = None, product_id: int = None, db=Depends(get_db)):
-    cursor = db.cursor(cursor_factory=RealDictCursor)
+async def get_products(request: Request, category_id: int = None, product_id: int = None, limit: int = None, page_cursor: str = Query(None, alias="cursor"), fields: str = None, db=Depends(get_async_db)):
+    cache_key = response_cache.key("products", category_id=category_id, product_id=product_id, limit=limit, cursor=page_cursor, fields=fields)
+    cached = await response_cache.get_async(cache_key)
+    if cached is not None:
+        return json_response(request, cached)
+    cursor = db.cursor()
     try:
-        query = "SELECT product_id, name, description, base_price, category_id, seller_id FROM product"
+        requested = parse_fields(fields)
+        limit = page_limit(limit)
+        query = f"SELECT {select_columns(requested)} FROM product"
+        conditions = []
         params = []
         
         if product_id:
-            query += " WHERE product_id = %s"
+            conditions.append("product_id = %s")
             params.append(product_id)
         elif category_id:
-            query += " WHERE category_id = %s"
+            conditions.append("category_id = %s")
             params.append(category_id)
-        
-        cursor.execute(query, tuple(params))
-        products = cursor.fetchall()
-        
-        for p in products:
-            p["base_price"] = float(p["base_price"])
-            cursor.execute("SELECT * FROM product_variant WHERE product_id = %s", (p["product_id"],))
-            variants = cursor.fetchall()
-            for v in variants:
-                v["price"] = float(v["price"])
-                v.pop('created_at', None)
-                v.pop('updated_at', None)
-            p["variants"] = variants
-            
-            p["main_image"] = None
-            if p["variants"]:
-                cursor.execute("SELECT image_url FROM product_image WHERE variant_id = %s LIMIT 1", (p["variants"][0]["variant_id"],))
-                img = cursor.fetchone()
-                if img:
-                    p["main_image"] = img["image_url"]
 
-            # fetch rating
-            cursor.execute("SELECT AVG(rating) as avg, COUNT(review_id) as count FROM review WHERE product_id = %s", (p["product_id"],))
-            rev_data = cursor.fetchone()
-            p["average_rating"] = round(float(rev_data["avg"] or 0), 1)
-            p["total_reviews"] = rev_data["count"]
-        return standard_response(True, data=products)
+        # Keyset pagination: resume after the last product_id of the previous page
+        if page_cursor:
+            (after_id,) = decode_cursor(page_cursor)
+            conditions.append("product_id > %s")
+            params.append(after_id)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY product_id"
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit + 1)
+        
+        await cursor.execute(query, tuple(params))
+        products, next_cursor = paginate(await cursor.fetchall(), limit, lambda p: (p["product_id"],))
+        await hydrate_fields_async(cursor, products, requested)
+        response = standard_response(True, data=products)
+        response["next_cursor"] = next_cursor
+        # every listed product's tag, so a stock change (checkout) drops the pages showing it
+        tags = ["products"] + [f"product:{p['product_id']}" for p in products]
+        if product_id:
+            tags.append(f"product:{product_id}")
+        if category_id:
+            tags.append(f"category:{category_id}")
+        rendered = render_json(response)
+        await response_cache.set_async(cache_key, rendered, tags=tags)
+        return json_response(request, rendered)
     except Exception as e:
         return standard_response(False, message=str(e))
     finally:
-        cursor.close()
+        await cursor.close()
 
 @router.get("/products/search")
-def search_products(q: str = "", db=Depends(get_db)):
-    cursor = db.cursor(cursor_factory=RealDictCursor)
+async def search_products(q: str = "", limit: int = None, page_cursor: str = Query(None, alias="cursor"), fields: str = None, db=Depends(get_async_db)):
+    cursor = db.cursor()
     try:
-        cursor.execute(
-            "SELECT product_id, name, description, base_price, category_id, seller_id FROM product WHERE name ILIKE %s OR description ILIKE %s",
-            (f"%{q}%", f"%{q}%")
-        )
-        products = cursor.fetchall()
-        for p in products:
-            p["base_price"] = float(p["base_price"])
-            cursor.execute("SELECT * FROM product_variant WHERE product_id = %s", (p["product_id"],))
-            variants = cursor.fetchall()
-            for v in variants:
-                v["price"] = float(v["price"])
-                v.pop('created_at', None)
-                v.pop('updated_at', None)
-            p["variants"] = variants
-            
-            p["main_image"] = None
-            if p["variants"]:
-                cursor.execute("SELECT image_url FROM product_image WHERE variant_id = %s LIMIT 1", (p["variants"][0]["variant_id"],))
-                img = cursor.fetchone()
-                if img:
-                    p["main_image"] = img["image_url"]
+        requested = parse_fields(fields)
+        limit = page_limit(limit)
+        columns = select_columns(requested, prefix="p.")
+        tsquery = build_tsquery(q)
 
-            # fetch rating
-            cursor.execute("SELECT AVG(rating) as avg, COUNT(review_id) as count FROM review WHERE product_id = %s", (p["product_id"],))
-            rev_data = cursor.fetchone()
-            p["average_rating"] = round(float(rev_data["avg"] or 0), 1)
-            p["total_reviews"] = rev_data["count"]
-        return standard_response(True, data=products)
+        if tsquery:
+            # Ranked full-text search, paged on (rank, product_id)
+            query = RANKED_SEARCH_QUERY.format(columns=columns)
+            params = [tsquery]
+            if page_cursor:
+                after_rank, after_id = decode_cursor(page_cursor)
+                query += " AND (ts_rank_cd(p.search_vector, query), p.product_id) < (%s::real, %s)"
+                params.extend([after_rank, after_id])
+            query += " ORDER BY rank DESC, p.product_id DESC"
+            page_key = lambda p: (p["rank"], p["product_id"])
+        else:
+            # Empty search box: whole catalog in product_id order
+            query = f"SELECT {columns} FROM product p"
+            params = []
+            if page_cursor:
+                (after_id,) = decode_cursor(page_cursor)
+                query += " WHERE p.product_id > %s"
+                params.append(after_id)
+            query += " ORDER BY p.product_id"
+            page_key = lambda p: (p["product_id"],)
+
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit + 1)
+
+        await cursor.execute(query, tuple(params))
+        rows = await cursor.fetchall()
+        if tsquery and not rows and not page_cursor:
+            # Nothing matched word prefixes, try a typo tolerant match on names
+            await cursor.execute(FUZZY_SEARCH_QUERY.format(columns=columns), (q, q, limit or FUZZY_MAX_RESULTS))
+            rows = await cursor.fetchall()
+
+        products, next_cursor = paginate(rows, limit, page_key)
+        for p in products:
+            p.pop("rank", None)
+        await hydrate_fields_async(cursor, products, requested)
+        response = standard_response(True, data=products)
+        response["next_cursor"] = next_cursor
+        return response
     except Exception as e:
         return standard_response(False, message=str(e))
     finally:
-        cursor.close()
+        await cursor.close()
+
+@router.get("/products/suggest")
+async def suggest_products(q: str = "", limit: int = 8):
+    # Served from the in-memory prefix index, no database round trip
+    return standard_response(True, data=suggest_index.suggest(q, limit))
 
 @router.get("/products/recommendations")
-def get_recommendations(limit: int = 4, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+async def get_recommendations(limit: int = 4, current_user: dict = Depends(get_current_user), db=Depends(get_async_db)):
     user_id = current_user["user_id"]
-    cursor = db.cursor(cursor_factory=RealDictCursor)
+    cursor = db.cursor()
     try:
-        # 1. Find categories the user has bought OR rated highly
-        cursor.execute("""
-            SELECT DISTINCT p.category_id 
-            FROM product p
-            LEFT JOIN review r ON p.product_id = r.product_id AND r.user_id = %s
-            LEFT JOIN order_item oi ON p.product_id = oi.product_id
-            LEFT JOIN orders o ON oi.order_id = o.order_id AND o.user_id = %s AND o.status = 'delivered'
-            WHERE r.rating >= 4 OR oi.order_item_id IS NOT NULL
-        """, (user_id, user_id))
-        cats = cursor.fetchall()
-        
-        if not cats:
-            return standard_response(True, data=[])
-            
-        cat_ids = tuple(c["category_id"] for c in cats)
-        
-        # 2. Find highly rated or relative products from those categories (Allowing items they already bought to show up for demo)
-        query_recs = """
-            SELECT 
-                p.product_id, 
-                p.name, 
-                p.base_price,
-                COALESCE(AVG(r.rating), 0) AS average_rating,
-                COUNT(r.review_id) AS total_reviews
-            FROM 
-                product p
-            LEFT JOIN review r ON p.product_id = r.product_id
-            WHERE p.category_id IN %s 
-            GROUP BY p.product_id
-            ORDER BY average_rating DESC, RANDOM()
-            LIMIT %s
-        """
-        cursor.execute(query_recs, (cat_ids, limit))
-        products = cursor.fetchall()
-        
-        # Hydrate images for the frontend card Component
-        for p in products:
-            p["base_price"] = float(p["base_price"])
-            p["average_rating"] = round(float(p["average_rating"]), 1)
-            cursor.execute("""
-                SELECT pi.image_url 
-                FROM product_image pi 
-                JOIN product_variant pv ON pi.variant_id = pv.variant_id 
-                WHERE pv.product_id = %s 
-                LIMIT 1
-            """, (p["product_id"],))
-            img = cursor.fetchone()
-            p["main_image"] = img["image_url"] if img else None
-            
+        # Precomputed by build_recommendations.py, users without history get none
+        await cursor.execute(USER_RECOMMENDATIONS_QUERY, (user_id, page_limit(limit)))
+        products = await cursor.fetchall()
+        # rows already carry the image and rating counters, so this runs no queries
+        await hydrate_products_async(cursor, products, variants=False, main_image=False)
         return standard_response(True, data=products)
     except Exception as e:
         return standard_response(False, message=str(e))
     finally:
-        cursor.close()
+        await cursor.close()
+
+@router.get("/products/{product_id}/recommendations")
+async def get_similar_products(product_id: int, request: Request, limit: int = 4, db=Depends(get_async_db)):
+    cache_key = response_cache.key("similar", product_id=product_id, limit=limit)
+    cached = await response_cache.get_async(cache_key)
+    if cached is not None:
+        return json_response(request, cached)
+    cursor = db.cursor()
+    try:
+        await cursor.execute(PRODUCT_RECOMMENDATIONS_QUERY, (product_id, page_limit(limit)))
+        products = await cursor.fetchall()
+        await hydrate_products_async(cursor, products, variants=False, main_image=False)
+        rendered = render_json(standard_response(True, data=products))
+        await response_cache.set_async(cache_key, rendered, tags=[f"product:{product_id}"])
+        return json_response(request, rendered)
+    except Exception as e:
+        return standard_response(False, message=str(e))
+    finally:
+        await cursor.close()
 
 @router.get("/products/top-rated")
-def get_top_rated_products(limit: int = 10, min_reviews: int = 5, db=Depends(get_db)):
-    cursor = db.cursor(cursor_factory=RealDictCursor)
+async def get_top_rated_products(request: Request, limit: int = 10, min_reviews: int = 5, db=Depends(get_async_db)):
+    cache_key = response_cache.key("top-rated", limit=limit)
+    cached = await response_cache.get_async(cache_key)
+    if cached is not None:
+        return json_response(request, cached)
+    cursor = db.cursor()
     try:
-        query = """
-            SELECT 
-                p.product_id, 
-                p.name, 
-                p.base_price as price,
-                p.category_id as category,
-                COALESCE(AVG(r.rating), 0) AS "averageRating",
-                COUNT(DISTINCT r.review_id) AS "totalReviews",
-                COALESCE(SUM(oi.quantity), 0) AS "totalSales"
-            FROM 
-                product p
-            LEFT JOIN 
-                review r ON p.product_id = r.product_id
-            LEFT JOIN
-                product_variant pv ON p.product_id = pv.product_id
-            LEFT JOIN
-                order_item oi ON pv.variant_id = oi.variant_id
-            GROUP BY 
-                p.product_id
-            HAVING 
-                COALESCE(AVG(r.rating), 0) >= 0
-            ORDER BY 
-                "averageRating" DESC, 
-                "totalSales" DESC,
-                "totalReviews" DESC
-            LIMIT %s
-        """
-        cursor.execute(query, (limit,))
-        products = cursor.fetchall()
+        # Ranking and images come from the materialized leaderboard in one query
+        await cursor.execute(TOP_RATED_QUERY, (limit,))
+        products = await cursor.fetchall()
         
         for p in products:
             p["price"] = float(p["price"])
             p["averageRating"] = round(float(p["averageRating"]), 1)
-            # fetch all images linked to this product (via its variants)
-            cursor.execute("""
-                SELECT DISTINCT pi.image_url 
-                FROM product_image pi 
-                JOIN product_variant pv ON pi.variant_id = pv.variant_id 
-                WHERE pv.product_id = %s
-            """, (p["product_id"],))
-            imgs = cursor.fetchall()
-            p["images"] = [img["image_url"] for img in imgs]
             p["main_image"] = p["images"][0] if p["images"] else None
             
-        return standard_response(True, data=products)
+        response = standard_response(True, data=products)
+        rendered = render_json(response)
+        await response_cache.set_async(cache_key, rendered, tags=["products"])
+        return json_response(request, rendered)
     except Exception as e:
         return standard_response(False, message=str(e))
     finally:
-        cursor.close()
+        await cursor.close()
 
 @router.get("/products/{product_id}/reviews")
-def get_reviews(product_id: int, db=Depends(get_db)):
-    cursor = db.cursor(cursor_factory=RealDictCursor)
+async def get_reviews(product_id: int, request: Request, db=Depends(get_async_db)):
+    cache_key = response_cache.key("reviews", product_id=product_id)
+    cached = await response_cache.get_async(cache_key)
+    if cached is not None:
+        return json_response(request, cached)
+    cursor = db.cursor()
     try:
-        cursor.execute(
+        await cursor.execute(
             "SELECT r.review_id, r.rating, r.comment, r.created_at, u.username, u.first_name FROM review r JOIN users u ON r.user_id = u.user_id WHERE r.product_id = %s",
             (product_id,)
         )
-        reviews = cursor.fetchall()
+        reviews = await cursor.fetchall()
         for r in reviews:
             r["created_at"] = r["created_at"].isoformat() if r["created_at"] else None
-        return standard_response(True, data=reviews)
+        response = standard_response(True, data=reviews)
+        rendered = render_json(response)
+        await response_cache.set_async(cache_key, rendered, tags=[f"product:{product_id}"])
+        return json_response(request, rendered)
     except Exception as e:
         return standard_response(False, message=str(e))
     finally:
-        cursor.close()
+        await cursor.close()
 
 @router.post("/reviews")
-def create_review(review: ReviewCreate, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+def create_review(review: ReviewCreate, current_user: dict = Depends(get_current_user), db=Depends(get_db),
+                  idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     user_id = current_user["user_id"]
     cursor = db.cursor(cursor_factory=RealDictCursor)
     try:
+        # A retried submit gets the original review back instead of "already reviewed"
+        if idempotency_key:
+            replay = claim_key(db, user_id, idempotency_key, "review", review.dict())
+            if replay is not None:
+                db.rollback()
+                return replay
+
         # Check if they already reviewed this product
         cursor.execute("SELECT review_id FROM review WHERE user_id = %s AND product_id = %s", (user_id, review.product_id))
         if cursor.fetchone():
+            # release the claimed idempotency key with the transaction
+            db.rollback()
             return standard_response(False, message="You have already reviewed this product")
 
         # Check if they actually bought it (Verified Purchase check)
@@ -250,15 +260,20 @@ def create_review(review: ReviewCreate, current_user: dict = Depends(get_current
             WHERE o.user_id = %s AND pv.product_id = %s AND o.status = 'delivered'
         """, (user_id, review.product_id))
         if not cursor.fetchone():
-             return standard_response(False, message="You can only review products you have purchased and received")
+            db.rollback()
+            return standard_response(False, message="You can only review products you have purchased and received")
 
         cursor.execute(
             "INSERT INTO review (rating, comment, user_id, product_id) VALUES (%s, %s, %s, %s) RETURNING review_id",
             (review.rating, review.comment, user_id, review.product_id)
         )
         review_id = cursor.fetchone()["review_id"]
+        response = standard_response(True, data={"review_id": review_id}, message="Review submitted successfully")
+        if idempotency_key:
+            save_response(db, user_id, idempotency_key, response)
         db.commit()
-        return standard_response(True, data={"review_id": review_id}, message="Review submitted successfully")
+        response_cache.invalidate("products", f"product:{review.product_id}")
+        return response
     except Exception as err:
         db.rollback()
         return standard_response(False, message=f"Failed to submit review: {str(err)}")
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, Depends
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json
 from database import get_db, standard_response
 from models import ProductCreate, ProductUpdate, OrderItemStatusUpdate
+from catalog import hydrate_products
+from suggest import suggest_index
+from cache import response_cache
+from images import existing_derivatives
 from auth_utils import role_required
 
 router = APIRouter(prefix="/api", tags=["seller"])
@@ -20,24 +24,7 @@ def get_seller_products(current_user: dict = Depends(role_required(["seller", "a
             WHERE p.seller_id = %s
             GROUP BY p.product_id
         """, (seller_id,))
-        products = cursor.fetchall()
-        for p in products:
-            p["base_price"] = float(p["base_price"])
-            cursor.execute("SELECT * FROM product_variant WHERE product_id = %s", (p["product_id"],))
-            variants = cursor.fetchall()
-            for v in variants:
-                v["price"] = float(v["price"])
-                v.pop('created_at', None)
-                v.pop('updated_at', None)
-            p["variants"] = variants
-            
-            p["main_image"] = None
-            if p["variants"]:
-                cursor.execute("SELECT image_url FROM product_image WHERE variant_id = %s LIMIT 1", (p["variants"][0]["variant_id"],))
-                img = cursor.fetchone()
-                if img:
-                    p["main_image"] = img["image_url"]
-
+        products = hydrate_products(cursor, cursor.fetchall(), ratings=False)
         return standard_response(True, data=products)
     except Exception as e:
         return standard_response(False, message=str(e))
@@ -63,8 +50,14 @@ def create_seller_product(product: ProductCreate, image_url: str = "", current_u
         variant_id = cursor.fetchone()["variant_id"]
         
         if image_url:
-            cursor.execute("INSERT INTO product_image (image_url, variant_id) VALUES (%s,%s)", (image_url, variant_id))
+            derived = existing_derivatives(image_url) or {}
+            cursor.execute(
+                "INSERT INTO product_image (image_url, variant_id, thumbnail_url, derivatives) VALUES (%s,%s,%s,%s)",
+                (image_url, variant_id, derived.get("thumbnail_url"), Json(derived["derivatives"]) if derived else None)
+            )
         db.commit()
+        suggest_index.put("product", product_id, product.name)
+        response_cache.invalidate("products", f"category:{product.category_id}")
         return standard_response(True, data={"product_id": product_id}, message="Product created successfully")
     except Exception as err:
         db.rollback()
@@ -95,6 +88,12 @@ def update_seller_product(product_id: int, product: ProductUpdate, current_user:
             params.append(product_id)
             cursor.execute(f"UPDATE product SET {', '.join(updates)} WHERE product_id=%s", params)
             db.commit()
+            if product.name:
+                suggest_index.put("product", product_id, product.name)
+            tags = ["products", f"product:{product_id}"]
+            if product.category_id:
+                tags.append(f"category:{product.category_id}")
+            response_cache.invalidate(*tags)
         return standard_response(True, message="Product updated successfully")
     except Exception as e:
         db.rollback()
@@ -117,6 +116,8 @@ def delete_seller_product(product_id: int, current_user: dict = Depends(role_req
 
         cursor.execute("DELETE FROM product WHERE product_id=%s", (product_id,))
         db.commit()
+        suggest_index.remove("product", product_id)
+        response_cache.invalidate("products", f"product:{product_id}")
         return standard_response(True, message="Product deleted successfully")
     except Exception as e:
         db.rollback()
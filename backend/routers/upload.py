@@ -1,8 +1,12 @@
 import os
 import uuid
-import shutil
+import hashlib
+from typing import List
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from database import standard_response
+from images import generate_derivatives
 
 router = APIRouter(prefix="/api/upload", tags=["upload"])
 
@@ -11,17 +15,154 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 UPLOAD_DIR = os.path.join(PROJECT_ROOT, "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "20"))
+CHUNK_SIZE = 64 * 1024
+# multipart boundaries and part headers around each file
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Request body caps for UploadLimitMiddleware, by path
+REQUEST_LIMITS = {
+    "/api/upload/image": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    "/api/upload/images": MAX_BATCH_FILES * (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD),
+}
+
+
+def too_large(limit):
+    return f"Upload exceeds the {limit // (1024 * 1024)}MB limit"
+
+
+class UploadLimitMiddleware:
+    """Caps the request body of the upload routes while it is received.
+
+    Starlette parses the whole multipart body into temp files before the
+    route runs, so save_upload's own check comes too late to protect the
+    disk. This rejects a too large Content-Length up front and counts the
+    bytes of chunked or lying requests as they arrive.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = REQUEST_LIMITS.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": too_large(limit)}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # surfaces from request.form() as a 413 through FastAPI's handlers
+                    raise HTTPException(status_code=413, detail=too_large(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+
+def sniff_image_type(head: bytes):
+    """Extension for the image format in the first bytes of a file, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+async def save_upload(file: UploadFile):
+    """Stream an upload to disk in chunks without blocking the event loop.
+
+    The type comes from the file's magic bytes, not its name. The request
+    body is already capped by UploadLimitMiddleware; the per-file limit is
+    checked again here since a batch may hold several files.
+    Files are stored under the SHA-256 of their bytes, so re-uploading the
+    same photo reuses the existing file and URL (see gc_uploads.py).
+    """
+    head = await file.read(CHUNK_SIZE)
+    ext = sniff_image_type(head)
+    if not ext:
+        raise HTTPException(status_code=400, detail="File type not allowed")
+
+    part_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+
+    def write_chunk(chunk):
+        buffer.write(chunk)
+        digest.update(chunk)
+
+    buffer = await run_in_threadpool(open, part_path, "wb")
+    try:
+        size = 0
+        chunk = head
+        while chunk:
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit")
+            await run_in_threadpool(write_chunk, chunk)
+            chunk = await file.read(CHUNK_SIZE)
+        await run_in_threadpool(buffer.close)
+
+        filename = f"{digest.hexdigest()}{ext}"
+        save_path = os.path.join(UPLOAD_DIR, filename)
+        if os.path.exists(save_path):
+            # identical bytes are already stored: keep that blob and refresh its
+            # mtime so gc_uploads.py treats it as a fresh, not yet linked upload
+            await run_in_threadpool(os.remove, part_path)
+            await run_in_threadpool(os.utime, save_path)
+        else:
+            await run_in_threadpool(os.replace, part_path, save_path)
+    except BaseException:
+        buffer.close()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    url = f"/uploads/{filename}"
+    # Thumbnails/WebP copies for listings; a failure here must not lose the upload
+    try:
+        derived = await run_in_threadpool(generate_derivatives, url)
+    except Exception as e:
+        print(f"Error generating derivatives for {url}: {e}")
+        derived = None
+
+    return {
+        "url": url,
+        "filename": filename,
+        "thumbnail_url": derived["thumbnail_url"] if derived else None,
+        "derivatives": derived["derivatives"] if derived else None,
+    }
+
 @router.post("/image")
 async def upload_image(file: UploadFile = File(...)):
-    allowed = [".jpg", ".jpeg", ".png", ".webp", ".gif"]
-    ext = os.path.splitext(file.filename)[1].lower()
-    if ext not in allowed:
-        raise HTTPException(status_code=400, detail="File type not allowed")
-    
-    filename = f"{uuid.uuid4().hex}{ext}"
-    save_path = os.path.join(UPLOAD_DIR, filename)
-    
-    with open(save_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return standard_response(True, data={"url": f"/uploads/{filename}", "filename": filename}, message="Image uploaded successfully")
+    data = await save_upload(file)
+    return standard_response(True, data=data, message="Image uploaded successfully")
+
+@router.post("/images")
+async def upload_images(files: List[UploadFile] = File(...)):
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch")
+
+    # One bad file does not fail the batch, each result reports its own outcome
+    results = []
+    for file in files:
+        try:
+            data = await save_upload(file)
+            results.append({"original_filename": file.filename, "success": True, **data})
+        except HTTPException as e:
+            results.append({"original_filename": file.filename, "success": False, "message": e.detail})
+    uploaded = sum(1 for r in results if r["success"])
+    return standard_response(uploaded > 0, data=results, message=f"Uploaded {uploaded} of {len(files)} images")
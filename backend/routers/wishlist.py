@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from psycopg2.extras import RealDictCursor
 from database import get_db, standard_response
+from async_database import get_async_db
 from auth_utils import get_current_user
 from pydantic import BaseModel
 
@@ -10,11 +10,11 @@ class WishlistItemToggle(BaseModel):
     product_id: int
 
 @router.get("/")
-def get_wishlist(current_user: dict = Depends(get_current_user), db=Depends(get_db)):
+async def get_wishlist(current_user: dict = Depends(get_current_user), db=Depends(get_async_db)):
     user_id = current_user["user_id"]
-    cursor = db.cursor(cursor_factory=RealDictCursor)
+    cursor = db.cursor()
     try:
-        cursor.execute("""
+        await cursor.execute("""
             SELECT 
                 p.product_id, 
                 p.name, 
@@ -34,14 +34,14 @@ def get_wishlist(current_user: dict = Depends(get_current_user), db=Depends(get_
             WHERE w.user_id = %s
             ORDER BY w.created_at DESC
         """, (user_id,))
-        items = cursor.fetchall()
+        items = await cursor.fetchall()
         for i in items:
             i["base_price"] = float(i["base_price"])
         return standard_response(True, data=items)
     except Exception as e:
         return standard_response(False, message=str(e))
     finally:
-        cursor.close()
+        await cursor.close()
 
 @router.post("/toggle")
 def toggle_wishlist(data: WishlistItemToggle, current_user: dict = Depends(get_current_user), db=Depends(get_db)):
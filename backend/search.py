@@ -0,0 +1,28 @@
+# Product search backed by the product.search_vector GIN index (see migrate_perf).
+# Every query word is prefix matched so the search box works as typeahead.
+import re
+
+RANKED_SEARCH_QUERY = """
+    SELECT {columns}, ts_rank_cd(p.search_vector, query) AS rank
+    FROM product p, to_tsquery('simple', %s) query
+    WHERE p.search_vector @@ query
+"""
+
+# Fallback for typos: trigram similarity on the name (idx_product_name_trgm)
+FUZZY_SEARCH_QUERY = """
+    SELECT {columns}
+    FROM product p
+    WHERE p.name %% %s
+    ORDER BY similarity(p.name, %s) DESC, p.product_id
+    LIMIT %s
+"""
+
+FUZZY_MAX_RESULTS = 20
+
+
+def build_tsquery(q):
+    """Turn free text into a prefix tsquery ("red sil" -> "red:* & sil:*"), or None."""
+    words = re.findall(r"\w+", q.lower())
+    if not words:
+        return None
+    return " & ".join(f"{w}:*" for w in words)
@@ -0,0 +1,100 @@
+# SQL profiling on top of the metrics cursors.
+# SLOW_QUERY_MS logs any statement slower than the threshold (0 disables),
+# SLOW_QUERY_EXPLAIN=1 adds its plan for SELECTs: EXPLAIN (ANALYZE, BUFFERS)
+# for plain table reads, a plain EXPLAIN when the SELECT calls other functions.
+# SQL_TRACE=1 is a debug mode: every statement a request runs is recorded
+# and returned in a Server-Timing header (visible in the browser devtools
+# timing tab) along with X-Query-Count. Do not enable it in production, the
+# header exposes SQL text.
+import hashlib
+import os
+import re
+import metrics
+
+SQL_TRACE = os.getenv("SQL_TRACE", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "0") == "1"
+# Server-Timing entries per response, a list page can run hundreds of statements
+MAX_TIMING_ENTRIES = 30
+
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS) "
+PLAN_ONLY_PREFIX = "EXPLAIN "
+
+# Calls that only read; a SELECT calling anything else (refresh_product_leaderboard(),
+# reserve_stock(), ...) may have side effects that ANALYZE would run a second time.
+# Keywords followed by "(" (IN, EXISTS, LATERAL, ...) are matched by the same regex.
+READ_ONLY_CALLS = {
+    "count", "sum", "avg", "min", "max", "coalesce", "nullif", "greatest", "least", "round",
+    "lower", "upper", "length", "trim", "abs", "ceil", "floor", "concat", "split_part",
+    "array_agg", "string_agg", "json_agg", "jsonb_agg", "json_build_object", "jsonb_build_object",
+    "jsonb_array_elements", "unnest", "array_length", "cardinality", "row_number", "rank",
+    "dense_rank", "similarity", "word_similarity", "ts_rank", "ts_rank_cd", "to_tsvector",
+    "to_tsquery", "plainto_tsquery", "websearch_to_tsquery", "setweight", "now", "date_trunc",
+    "make_interval", "extract", "cast",
+    "select", "from", "in", "exists", "any", "all", "values", "lateral", "as", "on", "over",
+    "filter", "and", "or", "not", "where", "when", "then", "else", "case", "using", "join",
+    "distinct", "array", "interval", "by",
+}
+
+
+def normalize(statement):
+    if isinstance(statement, bytes):
+        statement = statement.decode(errors="replace")
+    return re.sub(r"\s+", " ", str(statement)).strip()
+
+
+def fingerprint(params):
+    """Short stable hash of the parameters, to spot repeated calls without logging values."""
+    if params is None:
+        return "-"
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:8]
+
+
+def observe(statement, params, elapsed):
+    """Called by the instrumented cursors after each statement.
+
+    Returns True when the statement was slow and should be explained.
+    """
+    metrics.record_query(statement, params, elapsed)
+    stats = metrics.current_request.get()
+    elapsed_ms = elapsed * 1000
+    if SQL_TRACE and stats is not None:
+        stats.statements.append((normalize(statement), fingerprint(params), elapsed_ms))
+    if not SLOW_QUERY_MS or elapsed_ms < SLOW_QUERY_MS:
+        return False
+    path = stats.path if stats is not None else "-"
+    print(f"Slow query {elapsed_ms:.1f}ms [{path}] params={fingerprint(params)}: {normalize(statement)[:2000]}")
+    return SLOW_QUERY_EXPLAIN and isinstance(statement, str) and statement.lstrip().upper().startswith("SELECT")
+
+
+def explain_prefix(statement):
+    """EXPLAIN with ANALYZE only for plain table reads, so explaining never repeats side effects."""
+    calls = {name.rsplit(".", 1)[-1].lower() for name in re.findall(r'([A-Za-z_][\w.]*)\s*\(', statement)}
+    if re.search(r"\bFROM\b", statement, re.IGNORECASE) and calls <= READ_ONLY_CALLS:
+        return EXPLAIN_PREFIX
+    return PLAN_ONLY_PREFIX
+
+
+def log_plan(rows):
+    print("  Plan:\n" + "\n".join(f"    {row[0]}" for row in rows))
+
+
+def _escape(text):
+    # header values must stay ASCII and must not close the quoted desc
+    return text.replace("\\", "").replace('"', "'").encode("ascii", "replace").decode()[:100]
+
+
+def server_timing(stats):
+    entries = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"']
+    for i, (statement, params_fp, elapsed_ms) in enumerate(stats.statements[:MAX_TIMING_ENTRIES], 1):
+        entries.append(f'q{i};dur={elapsed_ms:.1f};desc="{_escape(statement)} [{params_fp}]"')
+    return ", ".join(entries)
+
+
+async def sql_trace_middleware(request, call_next):
+    response = await call_next(request)
+    stats = metrics.current_request.get()
+    if stats is not None:
+        response.headers["Server-Timing"] = server_timing(stats)
+        response.headers["X-Query-Count"] = str(stats.queries)
+    return response
@@ -0,0 +1,151 @@
+# In-process typeahead index over product and category names.
+# Entries are kept in one sorted list and looked up with bisect, so a
+# suggestion request never touches Postgres. Built at startup; the worker
+# serving a seller/admin product write applies it at once, and a daemon
+# thread per worker rebuilds the index when the tables changed, so the other
+# workers (and category edits) catch up within SUGGEST_REFRESH_SECONDS.
+import bisect
+import os
+import re
+import threading
+import time
+
+MAX_SUGGESTIONS = 20
+SUGGEST_REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", "30"))
+
+# Cheap change check over exactly what the index holds, (id, name): any
+# insert, delete or rename moves a count or a hash sum. updated_at is not
+# used, the rating trigger and stock/price edits bump it on every review.
+SIGNATURE_QUERY = """
+    SELECT (SELECT COUNT(*) FROM product),
+           (SELECT COALESCE(SUM(hashtext(product_id || ':' || COALESCE(name, ''))::BIGINT), 0) FROM product),
+           (SELECT COUNT(*) FROM category),
+           (SELECT COALESCE(SUM(hashtext(category_id || ':' || COALESCE(name, ''))::BIGINT), 0) FROM category)
+"""
+
+
+def _word_keys(name):
+    """Every suffix of the name that starts at a word, lower cased.
+
+    "Red Silk Saree" -> ["red silk saree", "silk saree", "saree"], so typing
+    any word of a name finds it.
+    """
+    lowered = name.lower()
+    return [lowered[m.start():] for m in re.finditer(r"\w+", lowered)]
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # sorted (key, kind, ref_id, label) tuples
+        self._entries = []
+        # (kind, ref_id) -> entries owned by that product/category
+        self._refs = {}
+
+    def rebuild(self, products, categories):
+        """Replace the index with (id, name) pairs for products and categories."""
+        entries = []
+        refs = {}
+        for kind, rows in (("product", products), ("category", categories)):
+            for ref_id, name in rows:
+                owned = [(key, kind, ref_id, name) for key in _word_keys(name or "")]
+                refs[(kind, ref_id)] = owned
+                entries.extend(owned)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._refs = refs
+
+    def put(self, kind, ref_id, name):
+        """Add or rename a single product/category."""
+        with self._lock:
+            entries = list(self._entries)
+            for entry in self._refs.pop((kind, ref_id), []):
+                i = bisect.bisect_left(entries, entry)
+                if i < len(entries) and entries[i] == entry:
+                    del entries[i]
+            owned = [(key, kind, ref_id, name) for key in _word_keys(name or "")]
+            for entry in owned:
+                bisect.insort(entries, entry)
+            self._refs[(kind, ref_id)] = owned
+            # swap in a new list so readers never see a half-applied update
+            self._entries = entries
+
+    def remove(self, kind, ref_id):
+        with self._lock:
+            owned = self._refs.pop((kind, ref_id), [])
+            if not owned:
+                return
+            dropped = set(owned)
+            self._entries = [e for e in self._entries if e not in dropped]
+
+    def suggest(self, q, limit=8):
+        prefix = " ".join(q.lower().split())
+        if not prefix:
+            return []
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        entries = self._entries
+        results = []
+        seen = set()
+        i = bisect.bisect_left(entries, (prefix,))
+        while i < len(entries) and entries[i][0].startswith(prefix) and len(results) < limit:
+            _, kind, ref_id, label = entries[i]
+            if (kind, ref_id) not in seen:
+                seen.add((kind, ref_id))
+                results.append({"type": kind, "id": ref_id, "label": label})
+            i += 1
+        return results
+
+    def __len__(self):
+        return len(self._refs)
+
+
+suggest_index = PrefixIndex()
+
+
+_signature = None
+
+
+def load_suggestions(cursor):
+    """(Re)build the shared index from the database."""
+    global _signature
+    cursor.execute(SIGNATURE_QUERY)
+    signature = tuple(cursor.fetchone())
+    cursor.execute("SELECT product_id, name FROM product")
+    products = cursor.fetchall()
+    cursor.execute("SELECT category_id, name FROM category")
+    categories = cursor.fetchall()
+    suggest_index.rebuild(products, categories)
+    _signature = signature
+
+
+def refresh_suggestions(cursor):
+    """Rebuild the index only if products or categories changed since the last build."""
+    cursor.execute(SIGNATURE_QUERY)
+    if tuple(cursor.fetchone()) != _signature:
+        load_suggestions(cursor)
+
+
+def start_suggestion_refresher(pool):
+    if SUGGEST_REFRESH_SECONDS <= 0:
+        return
+
+    def loop():
+        while True:
+            time.sleep(SUGGEST_REFRESH_SECONDS)
+            try:
+                conn = pool.getconn()
+            except Exception as e:
+                print(f"Error refreshing suggestions: {e}")
+                continue
+            try:
+                with conn.cursor() as cur:
+                    refresh_suggestions(cur)
+                conn.rollback()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error refreshing suggestions: {e}")
+            finally:
+                pool.putconn(conn)
+
+    threading.Thread(target=loop, name="suggest-refresh", daemon=True).start()
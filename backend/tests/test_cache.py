@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+
+pytest.importorskip("fastapi")
+
+import cache
+from cache import MemoryBackend, NullBackend, ResponseCache
+
+
+def test_key_ignores_param_order_and_none():
+    assert ResponseCache.key("/products", page=2, q=None, category=3) == ResponseCache.key("/products", category=3, page=2)
+
+
+def test_invalidate_drops_only_tagged_entries():
+    c = ResponseCache(MemoryBackend())
+    c.set("list", {"n": 1}, ("products", "product:1", "product:2"))
+    c.set("detail:1", {"id": 1}, ("product:1",))
+    c.set("detail:2", {"id": 2}, ("product:2",))
+
+    c.invalidate("product:1")
+
+    assert c.get("list") is None
+    assert c.get("detail:1") is None
+    assert c.get("detail:2") == {"id": 2}
+    assert c.stats()["invalidated"] == 2
+
+
+def test_invalidate_unknown_tag_is_a_no_op():
+    c = ResponseCache(MemoryBackend())
+    c.set("a", 1, ("products",))
+    c.invalidate("category:9")
+    assert c.get("a") == 1
+    assert c.stats()["invalidated"] == 0
+
+
+def test_overwrite_moves_entry_to_new_tags():
+    backend = MemoryBackend()
+    backend.set("a", 1, 60, ("old",))
+    backend.set("a", 2, 60, ("new",))
+    assert backend.invalidate_tags(("old",)) == 0
+    assert backend.get("a") == 2
+    assert backend.invalidate_tags(("new",)) == 1
+
+
+def test_expired_entry_is_a_miss():
+    c = ResponseCache(MemoryBackend())
+    c.set("a", 1, ("products",), ttl=-1)
+    assert c.get("a") is None
+    # the expired entry no longer holds its tags
+    assert c.backend._tags == {}
+
+
+def test_lru_eviction_releases_tags():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", 1, 60, ("t",))
+    backend.set("b", 2, 60, ("t",))
+    backend.get("a")
+    backend.set("c", 3, 60, ("t",))
+    assert backend.get("b") is None
+    assert backend._tags["t"] == {"a", "c"}
+
+
+def test_hit_ratio():
+    c = ResponseCache(MemoryBackend())
+    c.set("a", 1, ())
+    c.get("a")
+    c.get("missing")
+    stats = c.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+
+def test_backend_errors_do_not_escape():
+    class Broken(NullBackend):
+        def get(self, key):
+            raise ConnectionError("down")
+
+        def invalidate_tags(self, tags):
+            raise ConnectionError("down")
+
+    c = ResponseCache(Broken())
+    assert c.get("a") is None
+    c.invalidate("products")
+    assert c.stats()["invalidated"] == 0
+
+
+def test_async_helpers():
+    c = ResponseCache(MemoryBackend())
+
+    async def scenario():
+        await c.set_async("a", {"x": 1}, ("products",))
+        return await c.get_async("a")
+
+    assert asyncio.run(scenario()) == {"x": 1}
+
+
+def test_several_workers_without_redis_disable_caching(monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_URL", "")
+    monkeypatch.setattr(cache, "WORKERS", 4)
+    assert isinstance(cache._make_backend(), NullBackend)
+    monkeypatch.setattr(cache, "WORKERS", 1)
+    assert isinstance(cache._make_backend(), MemoryBackend)
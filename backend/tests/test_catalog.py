@@ -0,0 +1,38 @@
+import pytest
+from catalog import encode_cursor, decode_cursor, page_limit, paginate, MAX_PAGE_LIMIT
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(4.5, 12)
+    assert decode_cursor(cursor) == [4.5, 12]
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor("é" * 40, 10 ** 12)
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+
+@pytest.mark.parametrize("bad", ["", "not-base64!", encode_cursor()[:-2] + "!!", "bm90IGpzb24="])
+def test_invalid_cursor(bad):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(bad)
+
+
+@pytest.mark.parametrize("limit, expected", [
+    (None, None), (0, 1), (-5, 1), (1, 1), (20, 20), (MAX_PAGE_LIMIT, MAX_PAGE_LIMIT), (10_000, MAX_PAGE_LIMIT),
+])
+def test_page_limit(limit, expected):
+    assert page_limit(limit) == expected
+
+
+def test_paginate_last_page_has_no_cursor():
+    rows = [{"id": 1}, {"id": 2}]
+    assert paginate(rows, 2, lambda r: (r["id"],)) == (rows, None)
+    assert paginate(rows, None, lambda r: (r["id"],)) == (rows, None)
+
+
+def test_paginate_trims_the_extra_row():
+    rows = [{"id": 1}, {"id": 2}, {"id": 3}]
+    page, cursor = paginate(rows, 2, lambda r: (r["id"],))
+    assert page == rows[:2]
+    assert decode_cursor(cursor) == [2]
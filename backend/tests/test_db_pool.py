@@ -0,0 +1,149 @@
+import threading
+import pytest
+
+pytest.importorskip("fastapi")
+psycopg2 = pytest.importorskip("psycopg2")
+
+from psycopg2 import extensions
+from db_pool import ManagedPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, fail_ping=False):
+        self.closed = 0
+        self.fail_ping = fail_ping
+        self.rollbacks = 0
+        self.info = type("Info", (), {"transaction_status": extensions.TRANSACTION_STATUS_IDLE})()
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, query):
+                if conn.fail_ping:
+                    raise psycopg2.OperationalError("server closed the connection")
+
+        return Cursor()
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakePool:
+    """Stands in for psycopg2's ThreadedConnectionPool, no database needed."""
+
+    def __init__(self):
+        self._pool = []
+        self.opened = 0
+        self.closed = []
+
+    def getconn(self):
+        if self._pool:
+            return self._pool.pop()
+        self.opened += 1
+        return FakeConnection()
+
+    def putconn(self, conn, close=False):
+        if close:
+            conn.closed = 1
+            self.closed.append(conn)
+        else:
+            self._pool.append(conn)
+
+
+def make_pool(**kwargs):
+    options = {"minconn": 0, "maxconn": 2, "timeout": 0.05, "check_idle": 60, "max_lifetime": 600}
+    options.update(kwargs)
+    managed = ManagedPool(**options)
+    managed._pool = FakePool()
+    return managed
+
+
+def test_connections_are_reused():
+    managed = make_pool()
+    conn = managed.getconn()
+    managed.putconn(conn)
+    assert managed.getconn() is conn
+    assert managed._pool.opened == 1
+
+
+def test_exhausted_pool_times_out():
+    managed = make_pool(maxconn=1)
+    conn = managed.getconn()
+    with pytest.raises(PoolTimeout):
+        managed.getconn()
+    assert managed.stats()["timeouts"] == 1
+
+    managed.putconn(conn)
+    assert managed.getconn() is conn
+
+
+def test_waiter_gets_the_returned_connection():
+    managed = make_pool(maxconn=1, timeout=2)
+    conn = managed.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(managed.getconn()))
+    waiter.start()
+    managed.putconn(conn)
+    waiter.join(2)
+    assert got == [conn]
+
+
+def test_open_transaction_is_rolled_back_on_return():
+    managed = make_pool()
+    conn = managed.getconn()
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    managed.putconn(conn)
+    assert conn.rollbacks == 1
+    assert managed.getconn() is conn
+
+
+def test_connection_past_max_lifetime_is_recycled():
+    managed = make_pool()
+    conn = managed.getconn()
+    managed.putconn(conn)
+    managed._born[id(conn)] -= 601
+
+    fresh = managed.getconn()
+    assert fresh is not conn
+    assert conn.closed
+    assert managed.stats()["recycled"] == 1
+
+
+def test_idle_connection_failing_its_ping_is_replaced():
+    managed = make_pool(check_idle=0)
+    conn = managed.getconn()
+    managed.putconn(conn)
+    conn.fail_ping = True
+
+    fresh = managed.getconn()
+    assert fresh is not conn
+    assert conn in managed._pool.closed
+
+
+def test_closed_connection_is_discarded_on_return():
+    managed = make_pool()
+    conn = managed.getconn()
+    conn.closed = 1
+    managed.putconn(conn)
+    stats = managed.stats()
+    assert (stats["broken"], stats["in_use"], stats["idle"]) == (1, 0, 0)
+    # its slot is free again
+    managed.getconn()
+    managed.getconn()
+
+
+def test_wait_histogram_counts_every_checkout():
+    managed = make_pool()
+    managed.putconn(managed.getconn())
+    managed.putconn(managed.getconn())
+    wait = managed.stats()["wait_ms"]
+    assert wait["count"] == 2
+    assert wait["buckets"]["+Inf"] == 2
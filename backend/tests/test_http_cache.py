@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import FastAPI, Request
+from http_cache import (
+    render_json, json_response, CachedStaticFiles, API_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL,
+)
+
+
+def request_with(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_etag_depends_only_on_body():
+    first = render_json({"success": True, "data": [1, 2]})
+    assert first == render_json({"success": True, "data": [1, 2]})
+    assert first["etag"] != render_json({"success": True, "data": [1, 3]})["etag"]
+    assert first["etag"].startswith('"') and first["etag"].endswith('"')
+
+
+def test_fresh_request_gets_the_body():
+    rendered = render_json({"a": 1})
+    response = json_response(request_with(), rendered)
+    assert response.status_code == 200
+    assert response.body == rendered["body"].encode()
+    assert response.headers["etag"] == rendered["etag"]
+    assert response.headers["cache-control"] == API_CACHE_CONTROL
+
+
+@pytest.mark.parametrize("header", [
+    "{etag}", "W/{etag}", '"other", {etag}', "*",
+])
+def test_matching_etag_is_not_modified(header):
+    rendered = render_json({"a": 1})
+    response = json_response(request_with(header.format(etag=rendered["etag"])), rendered)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == rendered["etag"]
+
+
+def test_stale_etag_gets_the_body():
+    rendered = render_json({"a": 1})
+    response = json_response(request_with(render_json({"a": 2})["etag"]), rendered)
+    assert response.status_code == 200
+
+
+def test_static_files_carry_cache_control(tmp_path):
+    testclient = pytest.importorskip("fastapi.testclient")
+    (tmp_path / "a.txt").write_text("hello")
+    app = FastAPI()
+    app.mount("/uploads", CachedStaticFiles(directory=tmp_path, cache_control=IMMUTABLE_CACHE_CONTROL))
+    client = testclient.TestClient(app)
+
+    response = client.get("/uploads/a.txt")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    revalidated = client.get("/uploads/a.txt", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
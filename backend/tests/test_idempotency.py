@@ -0,0 +1,96 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+database = pytest.importorskip("database")
+
+import idempotency
+from idempotency import claim_key, save_response, request_hash, MAX_KEY_LENGTH
+
+
+class FakeDb:
+    """Records statements and answers fetchone() from a scripted list."""
+
+    def __init__(self, *rows):
+        self.rows = list(rows)
+        self.statements = []
+
+    def cursor(self):
+        db = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, query, params=None):
+                db.statements.append((" ".join(query.split()), params))
+
+            def fetchone(self):
+                return db.rows.pop(0)
+
+        return Cursor()
+
+
+@pytest.fixture(autouse=True)
+def no_purge(monkeypatch):
+    monkeypatch.setattr(idempotency, "PURGE_PROBABILITY", 0)
+
+
+def test_request_hash_ignores_key_order():
+    assert request_hash({"a": 1, "b": [1, 2]}) == request_hash({"b": [1, 2], "a": 1})
+    assert request_hash({"a": 1}) != request_hash({"a": 2})
+
+
+def test_new_key_is_claimed():
+    db = FakeDb((1,))
+    assert claim_key(db, 7, "k1", "checkout", {"items": []}) is None
+    query, params = db.statements[0]
+    assert query.startswith("INSERT INTO idempotency_key")
+    assert params[:4] == (7, "k1", "checkout", request_hash({"items": []}))
+
+
+def test_completed_key_replays_the_stored_response():
+    stored = {"success": True, "data": {"order_id": 3}}
+    db = FakeDb(None, ("checkout", request_hash({"items": []}), stored))
+    assert claim_key(db, 7, "k1", "checkout", {"items": []}) == stored
+
+
+def test_key_reused_for_another_request_is_rejected():
+    stored = {"success": True}
+    db = FakeDb(None, ("checkout", request_hash({"items": [1]}), stored))
+    assert claim_key(db, 7, "k1", "checkout", {"items": [2]}) == database.standard_response(
+        False, message="Idempotency-Key was already used for a different request")
+
+    db = FakeDb(None, ("review", request_hash({"items": [2]}), stored))
+    assert claim_key(db, 7, "k1", "checkout", {"items": [2]})["success"] is False
+
+
+def test_unfinished_key_is_reported_in_progress():
+    db = FakeDb(None, ("checkout", request_hash({}), None))
+    assert claim_key(db, 7, "k1", "checkout", {}) == database.standard_response(
+        False, message="A request with this Idempotency-Key is still in progress")
+
+
+def test_overlong_key_is_rejected_without_queries():
+    db = FakeDb()
+    result = claim_key(db, 7, "k" * (MAX_KEY_LENGTH + 1), "checkout", {})
+    assert result["success"] is False
+    assert db.statements == []
+
+
+def test_purge_runs_before_the_claim(monkeypatch):
+    monkeypatch.setattr(idempotency, "PURGE_PROBABILITY", 1)
+    db = FakeDb((1,))
+    claim_key(db, 7, "k1", "checkout", {})
+    assert db.statements[0][0] == "DELETE FROM idempotency_key WHERE expires_at < NOW()"
+
+
+def test_save_response_stores_the_response():
+    db = FakeDb()
+    response = {"success": True}
+    assert save_response(db, 7, "k1", response) is response
+    query, params = db.statements[0]
+    assert query.startswith("UPDATE idempotency_key SET response")
+    assert params[0].adapted == response and params[1:] == (7, "k1")
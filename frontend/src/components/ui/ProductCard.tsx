@@ -14,7 +14,7 @@ export const ProductCard: React.FC<ProductCardProps> = ({ product }) => {
     // Logic to determine main image and price
     const firstVariant = product.variants?.[0];
     const culturalFallback = "/images/1_lRUm2IW.webp"; // Beautiful local loom/textile texture
-    const mainImage = (product as any).main_image || firstVariant?.images?.[0]?.image_url || culturalFallback;
+    const mainImage = (product as any).main_image_thumb || (product as any).main_image || firstVariant?.images?.[0]?.image_url || culturalFallback;
     const price = firstVariant?.price || (product as any).price || product.base_price;
     
     const { isInWishlist, toggleWishlist } = useWishlist();
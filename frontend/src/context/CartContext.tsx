@@ -1,4 +1,4 @@
-import React, { createContext, useContext, useState, useEffect, useCallback } from 'react';
+import React, { createContext, useContext, useState, useEffect, useCallback, useRef } from 'react';
 import type { CartItem, ProductVariant, Product } from '../types/schema';
 import { apiRequest } from '../utils/api';
 import { useToast } from './ToastContext';
@@ -33,6 +33,30 @@ export const CartProvider: React.FC<{ children: React.ReactNode }> = ({ children
     const { showToast } = useToast();
     const { user, isAuthenticated } = useAuth();
 
+    // Latest items for the login effect, which must not re-run on every cart change
+    const itemsRef = useRef(items);
+    itemsRef.current = items;
+
+    const applyServerItems = useCallback((serverItems: any[]) => {
+        setItems(prev => {
+            // Build a map of currently-known images (from optimistic updates)
+            const localImageMap = new Map(prev.map(i => [i.variant_id, i.image]));
+            return serverItems.map((item: any) => ({
+                cart_item_id: item.cart_item_id,
+                cart_id: item.cart_id,
+                variant_id: item.variant_id,
+                quantity: item.quantity,
+                productName: item.name,
+                price: Number(item.price),
+                // Prefer the server image if available, otherwise keep the locally cached image
+                image: item.image || localImageMap.get(item.variant_id) || '',
+                size: item.size || '',
+                color: item.color || '',
+                product_id: item.product_id
+            }));
+        });
+    }, []);
+
     const fetchCart = useCallback(async () => {
         if (!isAuthenticated) {
             setItems([]);
@@ -44,35 +68,48 @@ export const CartProvider: React.FC<{ children: React.ReactNode }> = ({ children
         setLoading(false);
         
         if (success && data?.items) {
-            setItems(prev => {
-                // Build a map of currently-known images (from optimistic updates)
-                const localImageMap = new Map(prev.map(i => [i.variant_id, i.image]));
-                return data.items.map((item: any) => ({
-                    cart_item_id: item.cart_item_id,
-                    cart_id: item.cart_id,
-                    variant_id: item.variant_id,
-                    quantity: item.quantity,
-                    productName: item.name,
-                    price: Number(item.price),
-                    // Prefer the server image if available, otherwise keep the locally cached image
-                    image: item.image || localImageMap.get(item.variant_id) || '',
-                    size: item.size || '',
-                    color: item.color || '',
-                    product_id: item.product_id
-                }));
-            });
+            applyServerItems(data.items);
         } else if (error) {
             console.error('Failed to fetch cart:', error);
         }
-    }, [isAuthenticated]);
+    }, [isAuthenticated, applyServerItems]);
+
+    // Merge the guest cart into the saved one in a single request
+    const mergeGuestCart = useCallback(async (guestItems: CartItemWithDetails[]) => {
+        setLoading(true);
+        const { success, data, error } = await apiRequest<{ items: any[]; rejected?: number[] }>('/cart', {
+            method: 'PUT',
+            body: JSON.stringify({
+                items: guestItems.map(i => ({ variant_id: i.variant_id, quantity: i.quantity || 1 }))
+            })
+        });
+        setLoading(false);
+
+        if (success && data?.items) {
+            applyServerItems(data.items);
+            // Variants deleted since they were added to the guest cart are dropped by the server
+            const rejected = guestItems.filter(i => data.rejected?.includes(i.variant_id));
+            if (rejected.length > 0) {
+                showToast(`No longer available, removed from your cart: ${rejected.map(i => i.productName).join(', ')}`, 'info');
+            }
+        } else {
+            showToast(`Could not add your cart items: ${error}`, 'error');
+            fetchCart();
+        }
+    }, [applyServerItems, fetchCart, showToast]);
 
     useEffect(() => {
         if (isAuthenticated) {
-            fetchCart();
+            const guestItems = itemsRef.current;
+            if (guestItems.length > 0) {
+                mergeGuestCart(guestItems);
+            } else {
+                fetchCart();
+            }
         } else {
             setItems([]);
         }
-    }, [isAuthenticated, fetchCart]);
+    }, [isAuthenticated, fetchCart, mergeGuestCart]);
 
     // Calculate totals
     const cartTotal = items.reduce((total, item) => total + (item.price * (item.quantity || 1)), 0);
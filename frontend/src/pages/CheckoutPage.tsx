@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { Layout } from '../components/layout/Layout';
 import { useCart } from '../context/CartContext';
 import { useToast } from '../context/ToastContext';
@@ -43,6 +43,13 @@ export const CheckoutPage: React.FC = () => {
     const [isProcessing, setIsProcessing] = useState(false);
     const [isSubmitted, setIsSubmitted] = useState(false);
     const [orderNum, setOrderNum] = useState('');
+    // Sent as Idempotency-Key so a retried submit cannot place the order twice
+    const [checkoutKey, setCheckoutKey] = useState(() => crypto.randomUUID());
+    const cartSignature = items.map(i => `${i.variant_id}:${i.quantity}`).join(',');
+    // a different cart is a different order
+    useEffect(() => {
+        setCheckoutKey(crypto.randomUUID());
+    }, [cartSignature]);
 
     const [shipping, setShipping] = useState({ firstName: '', lastName: '', email: '', phone: '', address: '', city: '', zip: '', lat: 23.8103, lng: 90.4125 }); // Default to Dhaka
     const [payment, setPayment] = useState({ cardNumber: '', expiry: '', cvv: '', cardName: '' });
@@ -114,8 +121,9 @@ export const CheckoutPage: React.FC = () => {
             }
         };
 
-        const { success, data, error } = await apiRequest<any>('/checkout', {
+        const { success, data, error, status } = await apiRequest<any>('/checkout', {
             method: 'POST',
+            headers: { 'Idempotency-Key': checkoutKey },
             body: JSON.stringify(payload)
         });
 
@@ -125,6 +133,12 @@ export const CheckoutPage: React.FC = () => {
             setIsSubmitted(true);
             showToast("Order placed successfully!", "success");
         } else {
+            // A definite rejection (e.g. out of stock) released its key on the server.
+            // After a network error or 5xx the order may have gone through, so the
+            // retry must reuse the key to get that order back instead of a duplicate.
+            if (status !== undefined && status < 500) {
+                setCheckoutKey(crypto.randomUUID());
+            }
             showToast(error || "Failed to process order", "error");
         }
         
@@ -9,7 +9,7 @@ export interface ApiRequestOptions extends RequestInit {
 export async function apiRequest<T>(
   endpoint: string,
   options: ApiRequestOptions = {}
-): Promise<{ success: boolean; data?: T; message?: string; error?: string }> {
+): Promise<{ success: boolean; data?: T; message?: string; error?: string; status?: number }> {
   try {
     const isGetReq = !options.method || options.method.toUpperCase() === 'GET';
     if (isGetReq && options.cacheTimeMs) {
@@ -41,7 +41,9 @@ export async function apiRequest<T>(
       return { 
         success: false, 
         message: result.message || 'An unexpected error occurred',
-        error: result.message || `Error: ${response.statusText}` 
+        error: result.message || `Error: ${response.statusText}`,
+        // HTTP status of the failed response, absent for network errors
+        status: response.status
       };
     }
 